@@ -0,0 +1,89 @@
+import math
+
+from background import BackgroundTasks
+from config import APPROX_REFINE_WORKERS
+
+# Two-sided 95% normal quantile used for the per-day error bounds
+Z_95 = 1.96
+
+
+class Estimate(list):
+    """
+    Day rows ({"_id": date, "count": n}) estimated from a sample.
+
+    Behaves like the exact row list the graphs already consume, and carries
+    how it was estimated so the response can say so.
+    """
+
+    def __init__(self, rows, sample_size, population, error_bound):
+        super().__init__(rows)
+        self.approximate = True
+        self.sample_size = sample_size
+        self.population = population
+        self.error_bound = error_bound
+
+
+def scale_sample(rows, sample_size, population):
+    """
+    Scale per-day sample counts up to the collection and bound the error.
+
+    Each day's count k out of n sampled documents estimates k / n * N. Its 95%
+    half-width is the normal approximation to the binomial,
+    1.96 * N * sqrt(p * (1 - p) / n); days with no sampled document get the
+    rule-of-three bound 3 * N / n.
+
+    Args:
+        rows: Sample counts per day, as returned by the $group stage
+        sample_size: Documents sampled (n)
+        population: Estimated documents in the collection (N)
+
+    Returns:
+        Estimate with counts rounded to integers and the largest per-day bound
+    """
+    if sample_size == 0:
+        return Estimate([], 0, population, 0)
+    scale = population / sample_size
+    error_bound = 3 * scale
+    estimated = []
+    for row in rows:
+        p = row["count"] / sample_size
+        error_bound = max(error_bound, Z_95 * population * math.sqrt(p * (1 - p) / sample_size))
+        estimated.append({"_id": row["_id"], "count": round(row["count"] * scale)})
+    return Estimate(estimated, sample_size, population, math.ceil(error_bound))
+
+
+# Computes exact values in the background after an estimate was served, so the
+# result cache has them for the next request
+refiner = BackgroundTasks(workers=APPROX_REFINE_WORKERS, name="approx-refine")
+
+
+def wants_approx(args):
+    """
+    Whether a request asked for approximate values (?approx=true).
+    """
+    return args.get("approx", "").lower() in ("1", "true", "yes")
+
+
+def mark_approximate(response, results, derived=None):
+    """
+    Flag estimated metrics in a graph response's metadata.
+
+    Args:
+        response: Graph response dict with "metadata"
+        results: The fetched row lists, one per metric (metrics1, metrics2, ...)
+        derived: Dict of derived metric name -> indexes (into results) it is computed from
+
+    Returns:
+        The response, with "approximate" set at the top level, and
+        "approximate", "error_bound", "confidence" and "sample_size" on each estimated metric
+    """
+    flags = [getattr(rows, "approximate", False) for rows in results]
+    for i, rows in enumerate(results):
+        metadata = response["metadata"][f"metrics{i + 1}"]
+        metadata["approximate"] = flags[i]
+        if flags[i]:
+            metadata.update(error_bound=rows.error_bound, confidence=0.95, sample_size=rows.sample_size)
+    for name, sources in (derived or {}).items():
+        response["metadata"][name]["approximate"] = any(flags[i] for i in sources)
+    response["approximate"] = any(flags)
+    return response
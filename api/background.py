@@ -0,0 +1,48 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("turf_monitor.background")
+
+
+class BackgroundTasks:
+    """
+    Runs work off the request path on a small thread pool. A task already
+    queued or running under the same key is not queued again.
+
+    Tasks run outside any request, so their queries get no time budget.
+    """
+
+    def __init__(self, workers, name):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, key, fn, args)
+        return True
+
+    def _run(self, key, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f"error running {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+
+# Side-collection refreshes and directory loads triggered by reads
+refreshers = BackgroundTasks(workers=1, name="side-refresh")
@@ -0,0 +1,135 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from pymongo import ReadPreference
+from pymongo.errors import ExecutionTimeout
+
+from coalesce import CoalesceTimeout
+from config import DASHBOARD_SECONDARY_READS, ENDPOINT_BUDGETS_MS, QUERY_BUDGET_MS
+
+_deadline = ContextVar("query_deadline", default=None)
+_secondary_reads = ContextVar("secondary_reads", default=False)
+
+# Errors that mean "this query ran out of time", as opposed to a real failure
+TIMEOUT_ERRORS = (ExecutionTimeout, CoalesceTimeout)
+
+# Route prefixes whose reads may be served by a secondary
+DASHBOARD_PREFIXES = ("/graph/", "/table/", "/contacts-data")
+
+
+@contextmanager
+def time_budget(budget_ms, secondary_reads=False):
+    """
+    Give every query issued inside the block a share of one time budget:
+    each one gets the remaining milliseconds as maxTimeMS.
+
+    Args:
+        budget_ms: Total milliseconds for the block, or None for no limit
+        secondary_reads: Read from secondaries when available
+    """
+    deadline = None if budget_ms is None else time.monotonic() + budget_ms / 1000
+    deadline_token = _deadline.set(deadline)
+    secondary_token = _secondary_reads.set(secondary_reads)
+    try:
+        yield
+    finally:
+        _secondary_reads.reset(secondary_token)
+        _deadline.reset(deadline_token)
+
+
+def remaining_ms():
+    """
+    Milliseconds left in the current budget, or None when there is no budget.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0, int((deadline - time.monotonic()) * 1000))
+
+
+def query_options(collection):
+    """
+    Apply the current budget to a query.
+
+    Returns:
+        (collection, max_time_ms): the collection with the read preference set,
+        and the maxTimeMS to send (None when there is no budget)
+
+    Raises:
+        ExecutionTimeout: The budget is already spent
+    """
+    if _secondary_reads.get():
+        collection = collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+    max_time_ms = remaining_ms()
+    if max_time_ms == 0:
+        raise ExecutionTimeout("time budget exhausted before the query was sent", code=50)
+    return collection, max_time_ms
+
+
+def budget_for(endpoint):
+    return ENDPOINT_BUDGETS_MS.get(endpoint, QUERY_BUDGET_MS)
+
+
+def fetch_metrics(calls):
+    """
+    Run each metric query in turn. A metric that runs out of time yields no
+    rows instead of failing the whole graph.
+
+    Args:
+        calls: List of (function, args) pairs
+
+    Returns:
+        (results, timed_out): one row list and one flag per call
+    """
+    results, timed_out = [], []
+    for fn, args in calls:
+        try:
+            results.append(fn(*args))
+            timed_out.append(False)
+        except TIMEOUT_ERRORS:
+            results.append([])
+            timed_out.append(True)
+    return results, timed_out
+
+
+def mark_timed_out(response, timed_out, derived=None):
+    """
+    Flag incomplete metrics in a graph response's metadata.
+
+    Args:
+        response: Graph response dict with "metadata"
+        timed_out: One flag per fetched metric (metrics1, metrics2, ...)
+        derived: Dict of derived metric name -> indexes (into timed_out) it is computed from
+
+    Returns:
+        The response, with "partial" set at the top level and on each affected metric
+    """
+    for i, flag in enumerate(timed_out):
+        response["metadata"][f"metrics{i + 1}"].update(partial=flag, timed_out=flag)
+    for name, sources in (derived or {}).items():
+        response["metadata"][name].update(partial=any(timed_out[i] for i in sources), timed_out=False)
+    response["partial"] = any(timed_out)
+    return response
+
+
+def init_app(app):
+    """
+    Give each request the query budget configured for its endpoint, and
+    secondary-preferred reads on dashboard routes when enabled.
+    """
+
+    @app.before_request
+    def _start_budget():
+        secondary = DASHBOARD_SECONDARY_READS and request.path.startswith(DASHBOARD_PREFIXES)
+        g.budget_context = time_budget(budget_for(request.endpoint), secondary)
+        g.budget_context.__enter__()
+
+    @app.teardown_request
+    def _end_budget(exc):
+        context = g.pop("budget_context", None)
+        if context is not None:
+            context.__exit__(None, None, None)
+
+    return app
@@ -0,0 +1,400 @@
+import functools
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import bson
+
+from budget import TIMEOUT_ERRORS, remaining_ms
+from coalesce import CoalesceTimeout, SingleFlight, bind_arguments, make_key
+from config import (
+    CACHE_BACKEND, CACHE_LOCK_TIMEOUT_SECONDS, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_URL,
+    COALESCE_TIMEOUT_SECONDS,
+)
+from metrics import record_cache
+
+_refreshing = ContextVar("cache_refreshing", default=False)
+
+# Values at least this large are zlib-compressed before storing
+COMPRESS_MIN_BYTES = 1024
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+LOCK_POLL_SECONDS = 0.05
+# A failed recompute is remembered this long, under the key plus this suffix,
+# so callers waiting on the lock fail with it instead of running the query again.
+# Timeouts aren't: they depend on the budget of the request that hit them.
+ERROR_SUFFIX = ":error"
+ERROR_TTL_SECONDS = 5
+
+
+def encode(value):
+    """
+    Serialize a service result to compact bytes: BSON (keeps datetimes and
+    ObjectIds intact), zlib-compressed when large, behind a one-byte header.
+    """
+    data = bson.encode({"v": value})
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def decode(data):
+    header, body = data[:1], data[1:]
+    if header == _ZLIB:
+        body = zlib.decompress(body)
+    return bson.decode(body)["v"]
+
+
+class CacheBackend(ABC):
+    """
+    Interface for result cache storage.
+
+    get/set/delete work on Python values. acquire_lock/release_lock guard a
+    key across every process sharing the backend so that only one of them
+    recomputes an expired entry.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """
+        Return the live value for key, or None if it is missing or expired.
+        """
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """
+        Store value under key for ttl seconds.
+        """
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """
+        Drop every entry, e.g. before benchmarking against another database.
+        """
+
+    @abstractmethod
+    def acquire_lock(self, key, ttl):
+        """
+        Try to take the recompute lock for key. Returns a token, or None if held elsewhere.
+        """
+
+    @abstractmethod
+    def release_lock(self, key, token):
+        """
+        Release the lock for key if token still holds it.
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Thread-safe in-process TTL cache with least-recently-used eviction.
+    Values are stored as-is, so only this process benefits.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._locks = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def acquire_lock(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            held = self._locks.get(key)
+            if held is not None and held[1] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[key] = (token, now + ttl)
+            return token
+
+    def release_lock(self, key, token):
+        with self._lock:
+            held = self._locks.get(key)
+            if held is not None and held[0] == token:
+                del self._locks[key]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache shared by every worker process on a host through one SQLite file.
+    """
+
+    PURGE_EVERY = 200
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, token TEXT, expires_at REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return decode(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, encode(value), time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def acquire_lock(self, key, ttl):
+        conn = self._connect()
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO locks (key, token, expires_at) VALUES (?, ?, ?)", (key, token, now + ttl)
+        )
+        return token if cursor.rowcount == 1 else None
+
+    def release_lock(self, key, token):
+        self._connect().execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+
+class RedisBackend(CacheBackend):
+    """
+    Cache shared by every instance through Redis (or anything speaking its
+    get/set/delete commands, e.g. a local stand-in for testing).
+    """
+
+    def __init__(self, url=None, client=None, prefix="turf:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return decode(data) if data is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, encode(value), px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def acquire_lock(self, key, ttl):
+        token = uuid.uuid4().hex
+        if self.client.set(f"{self.prefix}lock:{key}", token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_lock(self, key, token):
+        # Only delete our own lock; plain get/delete keeps stand-ins without Lua working
+        lock_key = f"{self.prefix}lock:{key}"
+        held = self.client.get(lock_key)
+        if held is not None and (held.decode() if isinstance(held, bytes) else held) == token:
+            self.client.delete(lock_key)
+
+
+def make_backend(name=CACHE_BACKEND, url=CACHE_URL):
+    """
+    Build the configured backend: "memory" (default), "sqlite" or "redis".
+    """
+    if name == "sqlite":
+        return SQLiteBackend(url or os.path.join("/tmp", "turf_monitor_cache.sqlite3"))
+    if name == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"unknown cache backend: {name}")
+
+
+result_cache = make_backend()
+_flights = SingleFlight("results_flight")
+
+
+@contextmanager
+def refresh():
+    """
+    Inside this block cached functions skip the lookup, recompute and store
+    the fresh value. Used by the cache warmer.
+    """
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+def _wait_seconds(limit):
+    """
+    How long a caller may wait for someone else's computation: limit, or less
+    if the request's time budget runs out first.
+    """
+    remaining = remaining_ms()
+    return limit if remaining is None else min(limit, remaining / 1000)
+
+
+def _error_record(error):
+    return {"module": type(error).__module__, "type": type(error).__qualname__, "message": str(error)}
+
+
+def _raise_recorded(record):
+    """
+    Re-raise a failure recorded by another process with its original type
+    when that type is importable here and takes a message, else as Exception.
+    """
+    error_type = getattr(sys.modules.get(record["module"]), record["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        try:
+            error = error_type(record["message"])
+        except TypeError:
+            error = Exception(record["message"])
+    else:
+        error = Exception(record["message"])
+    raise error
+
+
+def _compute_once(store, key, fn, args, kwargs, ttl):
+    """
+    Recompute a missing entry while holding the backend lock. Callers that
+    don't get the lock wait for the holder to store the value, or to record
+    that it failed, and only compute it themselves if the lock times out.
+
+    Raises:
+        CoalesceTimeout: The request's time budget ran out while waiting
+    """
+    budget_limited = _wait_seconds(CACHE_LOCK_TIMEOUT_SECONDS) < CACHE_LOCK_TIMEOUT_SECONDS
+    deadline = time.monotonic() + _wait_seconds(CACHE_LOCK_TIMEOUT_SECONDS)
+    while True:
+        token = store.acquire_lock(key, CACHE_LOCK_TIMEOUT_SECONDS)
+        if token is not None:
+            try:
+                store.delete(key + ERROR_SUFFIX)
+                value = fn(*args, **kwargs)
+            except TIMEOUT_ERRORS:
+                # Waiters take the lock once it's released and try within their own budgets
+                raise
+            except Exception as e:
+                # Waiters in other processes get the failure instead of re-running the query
+                store.set(key + ERROR_SUFFIX, _error_record(e), ERROR_TTL_SECONDS)
+                raise
+            else:
+                store.set(key, value, ttl)
+                return value
+            finally:
+                store.release_lock(key, token)
+        if time.monotonic() >= deadline:
+            if budget_limited:
+                raise CoalesceTimeout(f"time budget ran out waiting for {key}")
+            return fn(*args, **kwargs)
+        time.sleep(LOCK_POLL_SECONDS)
+        value = store.get(key)
+        if value is not None:
+            return value
+        error = store.get(key + ERROR_SUFFIX)
+        if error is not None:
+            _raise_recorded(error)
+
+
+def cached(fn=None, *, ttl=CACHE_TTL_SECONDS, cache=None, vary=None):
+    """
+    Decorator: cache a service function's result by its normalized arguments.
+
+    Args:
+        vary: Called with the call's arguments by name; its result is added to
+            the key, for results that also depend on something else, e.g. the date
+    """
+    if fn is None:
+        return functools.partial(cached, ttl=ttl, cache=cache, vary=vary)
+
+    def cache_key(args, kwargs):
+        key = make_key(fn, args, kwargs)
+        if vary is not None:
+            key += f"@{vary(bind_arguments(fn, args, kwargs))}"
+        return key
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        store = cache or result_cache
+        key = cache_key(args, kwargs)
+        if _refreshing.get():
+            value = fn(*args, **kwargs)
+            store.set(key, value, ttl)
+            return value
+        value = store.get(key)
+        record_cache("results", hit=value is not None)
+        if value is not None:
+            return value
+        # Identical calls in this process share one trip through the backend lock
+        return _flights.do(
+            key, _compute_once, store, key, fn, args, kwargs, ttl,
+            timeout=_wait_seconds(COALESCE_TIMEOUT_SECONDS),
+        )
+
+    def peek(*args, **kwargs):
+        """
+        Return the cached value for these arguments, or None, without computing it.
+        """
+        return (cache or result_cache).get(cache_key(args, kwargs))
+
+    wrapper.peek = peek
+    return wrapper
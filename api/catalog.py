@@ -0,0 +1,270 @@
+import re
+from typing import NamedTuple, Optional, Tuple
+
+from approx import mark_approximate
+from budget import fetch_metrics, mark_timed_out
+from indexes import INDEXES
+from services.contacts_monitor import count_contacts_data_by_day
+from services.graph import day_counter
+from timeseries import TimeSeries
+
+# Statistics TimeSeries.statistics can compute
+STATS = ("total", "min", "max", "average")
+
+# Per-day counters a metric can use. "count_data_by_day" counts documents of a
+# collection matching the filter; the others are dedicated service functions.
+COUNTERS = ("count_data_by_day", "count_contacts_data_by_day")
+
+_CLEANED_VS_RAW = {"statistics": {"metrics": ["metrics1", "metrics2"]}}
+_PERCENTAGE = {"label": "Percentage (%)", "color": "#10B981", "numerator": "metrics1", "denominator": "metrics2"}
+_ERROR_SOURCES = ["scrapper", "jobsearch", "transcript", "edgar", "apollo"]
+
+# Graphs served under /graph/<name>. Metrics are named metrics1..N in order;
+# ratios are computed per day from two of them and named after the metrics.
+CATALOG = {
+    "contacts": {
+        "metrics": [
+            {"label": "Contacts Gathered", "color": "#F97316", "db": "turf_mvp", "collection": "contacts"},
+            {"label": "Contacts without Email", "color": "#3B82F6", "db": "turf_mvp", "collection": "contacts",
+             "filter": {"email": None}},
+            {"label": "Contacts with multiple active experience", "color": "#10B981",
+             "counter": "count_contacts_data_by_day"},
+        ],
+        "statistics": {"metrics": ["metrics1", "metrics2", "metrics3"]},
+    },
+    **{
+        name: {
+            "metrics": [
+                {"label": "Cleaned Data", "color": "#F97316", "db": "turf_mvp", "collection": "datasources",
+                 "filter": {"type": datasource_type, "status": "Active"}},
+                {"label": "Raw Data", "color": "#3B82F6", "db": "turf_prototype", "collection": raw_collection},
+            ],
+            "ratios": [{"name": "metrics3", **_PERCENTAGE}],
+            **_CLEANED_VS_RAW,
+        }
+        for name, datasource_type, raw_collection in [
+            ("latest-news", "scrapper", "scrapper"),
+            ("latest-jobs", "jobsearch", "theirstack"),
+            ("latest-transcripts", "transcript", "koyfin_transcript"),
+            ("latest-fillings", "edgar", "edgar_file"),
+        ]
+    },
+    "error-logs": {
+        "metrics": [
+            *[
+                {"label": label, "color": color, "db": "turf_mvp", "collection": "loggers",
+                 "filter": {"source_type": source_type, "status": "error"}}
+                for source_type, label, color in [
+                    ("scrapper", "Scrapper", "#F97316"),
+                    ("jobsearch", "Jobsearch", "#3B82F6"),
+                    ("transcript", "Transcript", "#10B981"),
+                    ("edgar", "Edgar", "#F43F5E"),
+                    ("apollo", "Apollo", "#A78BFA"),
+                ]
+            ],
+            {"label": "Other", "color": "#FACC15", "db": "turf_mvp", "collection": "loggers",
+             "filter": {"source_type": {"$nin": _ERROR_SOURCES}, "status": "error"}},
+        ],
+        "statistics": {
+            "metrics": [f"metrics{i}" for i in range(1, 7)],
+            "stats": ["total"],
+            "grand_total": "total_data",
+        },
+    },
+}
+
+
+class CatalogError(ValueError):
+    """
+    Raised at startup for a catalog entry that can't be compiled.
+    """
+
+
+class FrozenQuery(tuple):
+    """
+    An immutable, hashable MongoDB filter: its (field, value) pairs, sorted.
+    Nested dicts and lists are frozen too.
+    """
+
+    @classmethod
+    def of(cls, query):
+        return cls(sorted((field, _freeze(value)) for field, value in query.items()))
+
+    def to_dict(self):
+        return {field: _thaw(value) for field, value in self}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenQuery.of(value)
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, FrozenQuery):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class MetricPlan(NamedTuple):
+    name: str
+    label: str
+    color: str
+    counter: str
+    db_name: Optional[str] = None
+    col_name: Optional[str] = None
+    match: FrozenQuery = FrozenQuery()
+
+    def call(self, period, tz, approx=False):
+        """
+        The (function, args) pair fetch_metrics runs for this metric.
+        """
+        if self.counter == "count_contacts_data_by_day":
+            return count_contacts_data_by_day, (period, tz)
+        return day_counter(approx), (self.db_name, self.col_name, period, self.match.to_dict(), tz)
+
+
+class RatioPlan(NamedTuple):
+    name: str
+    label: str
+    color: str
+    numerator: str
+    denominator: str
+
+
+class GraphPlan(NamedTuple):
+    name: str
+    metrics: Tuple[MetricPlan, ...]
+    ratios: Tuple[RatioPlan, ...] = ()
+    stat_metrics: Tuple[str, ...] = ()
+    stats: Tuple[str, ...] = STATS
+    grand_total: Optional[str] = None
+
+    def derived(self):
+        """
+        Ratio name -> indexes of the metrics it is computed from.
+        """
+        positions = {metric.name: i for i, metric in enumerate(self.metrics)}
+        return {ratio.name: (positions[ratio.numerator], positions[ratio.denominator]) for ratio in self.ratios}
+
+
+def _require(condition, graph, message):
+    if not condition:
+        raise CatalogError(f"graph {graph!r}: {message}")
+
+
+def _check_filter(graph, query):
+    _require(isinstance(query, dict), graph, f"filter must be a dict, got {query!r}")
+    _require(all(isinstance(field, str) for field in query), graph, f"filter fields must be strings: {query!r}")
+    # The day window is applied by the counter
+    _require("createdAt" not in query, graph, "filter must not constrain createdAt")
+
+
+def _check_indexed(graph, db_name, col_name):
+    indexes = INDEXES.get(db_name, {}).get(col_name)
+    _require(indexes is not None, graph, f"{db_name}.{col_name} has no entry in indexes.INDEXES")
+    _require(
+        any("createdAt" in [key for key, _ in keys] for keys, _ in indexes),
+        graph, f"{db_name}.{col_name} has no index covering createdAt",
+    )
+
+
+def compile_metric(graph, position, spec):
+    name = f"metrics{position}"
+    _require(spec.get("label"), graph, f"{name} needs a label")
+    _require(re.fullmatch(r"#[0-9A-Fa-f]{6}", spec.get("color", "")), graph, f"{name} needs a #RRGGBB color")
+    counter = spec.get("counter", "count_data_by_day")
+    _require(counter in COUNTERS, graph, f"{name} has unknown counter {counter!r}")
+    if counter != "count_data_by_day":
+        return MetricPlan(name, spec["label"], spec["color"], counter)
+
+    db_name, col_name = spec.get("db"), spec.get("collection")
+    _require(db_name and col_name, graph, f"{name} needs db and collection")
+    query = spec.get("filter", {})
+    _check_filter(graph, query)
+    _check_indexed(graph, db_name, col_name)
+    return MetricPlan(name, spec["label"], spec["color"], counter, db_name, col_name, FrozenQuery.of(query))
+
+
+def compile_graph(name, spec):
+    """
+    Validate one catalog entry and compile it into a GraphPlan.
+
+    Raises:
+        CatalogError: The entry is malformed or refers to something that doesn't exist
+    """
+    _require(re.fullmatch(r"[a-z0-9]+(-[a-z0-9]+)*", name), name, "name must be lowercase words joined by '-'")
+    _require(spec.get("metrics"), name, "needs at least one metric")
+    metrics = tuple(compile_metric(name, i + 1, metric) for i, metric in enumerate(spec["metrics"]))
+    metric_names = {metric.name for metric in metrics}
+
+    ratios = []
+    for ratio in spec.get("ratios", []):
+        ratio_name = ratio.get("name")
+        taken = metric_names | {r.name for r in ratios}
+        _require(ratio_name and ratio_name not in taken, name, f"ratio name {ratio_name!r} is missing or taken")
+        _require(ratio.get("label") and ratio.get("color"), name, f"{ratio_name} needs a label and color")
+        for side in ("numerator", "denominator"):
+            _require(ratio.get(side) in metric_names, name, f"{ratio_name} {side} {ratio.get(side)!r} is not a metric")
+        ratios.append(RatioPlan(ratio_name, ratio["label"], ratio["color"], ratio["numerator"], ratio["denominator"]))
+
+    statistics = spec.get("statistics", {})
+    stat_metrics = tuple(statistics.get("metrics", [metric.name for metric in metrics]))
+    _require(set(stat_metrics) <= metric_names, name, f"statistics refer to unknown metrics {stat_metrics}")
+    stats = tuple(statistics.get("stats", STATS))
+    _require(set(stats) <= set(STATS), name, f"unknown statistics {stats}, expected some of {STATS}")
+
+    return GraphPlan(name, metrics, tuple(ratios), stat_metrics, stats, statistics.get("grand_total"))
+
+
+def compile_catalog(catalog=CATALOG):
+    """
+    Compile every catalog entry. Run once at import so a bad entry fails startup.
+
+    Returns:
+        Dict of graph name -> GraphPlan
+    """
+    return {name: compile_graph(name, spec) for name, spec in catalog.items()}
+
+
+GRAPHS = compile_catalog()
+
+
+def build_graph(plan, period, tz, approx=False, shape=None):
+    """
+    Fetch a graph's metrics and assemble its response.
+
+    Args:
+        plan: GraphPlan to serve
+        period: Days to count back from today
+        tz: IANA timezone the days are bucketed in
+        approx: Estimate count_data_by_day metrics from samples
+        shape: Response shape for "data" (timeseries.SHAPES)
+
+    Returns:
+        Dict with "metadata", "statistics", "data" and the partial/approximate flags
+    """
+    results, timed_out = fetch_metrics([metric.call(period, tz, approx) for metric in plan.metrics])
+
+    # Combine metrics on one date index, missing dates filled with 0
+    series = TimeSeries.from_counts(results, period, tz=tz)
+    for ratio in plan.ratios:
+        series.add_ratio(ratio.name, ratio.numerator, ratio.denominator)
+
+    statistics = series.statistics(plan.stat_metrics, plan.stats)
+    if plan.grand_total:
+        statistics[plan.grand_total] = sum(series.total(name) for name in plan.stat_metrics)
+
+    derived = plan.derived()
+    response = {
+        "metadata": {
+            entry.name: {"color": entry.color, "label": entry.label} for entry in plan.metrics + plan.ratios
+        },
+        "statistics": statistics,
+        "data": series.serialize(shape),
+    }
+    return mark_approximate(mark_timed_out(response, timed_out, derived), results, derived)
@@ -0,0 +1,116 @@
+import functools
+import inspect
+import json
+import threading
+
+from config import COALESCE_TIMEOUT_SECONDS
+from metrics import record_cache
+
+
+class CoalesceTimeout(TimeoutError):
+    """
+    Raised to a caller that waited longer than the timeout for a shared call.
+    """
+
+
+def bind_arguments(fn, args, kwargs):
+    """
+    A call's arguments by parameter name, defaults included.
+    """
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def make_key(fn, args, kwargs):
+    """
+    Build a stable key for a call from the function and its normalized arguments.
+
+    Positional and keyword spellings of the same call, and calls that rely on
+    defaults, produce the same key. Dict arguments are compared by content.
+    """
+    arguments = json.dumps(bind_arguments(fn, args, kwargs), sort_keys=True, default=str)
+    return f"{fn.__module__}.{fn.__qualname__}:{arguments}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical calls share one execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is running wait for it and get the same result, or the same exception.
+    Once the call finishes the key is forgotten, so later calls run again.
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) once per key across concurrent callers.
+
+        Args:
+            key: Identity of the call
+            fn: Function to run if no identical call is in flight
+            timeout: Seconds a waiting caller will wait before CoalesceTimeout;
+                the running call itself is never interrupted
+
+        Returns:
+            The function's result, shared by every caller of that flight
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        record_cache(self.name, hit=not leader)
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise CoalesceTimeout(f"timed out after {timeout}s waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+_default = SingleFlight()
+
+
+def coalesce(fn=None, *, timeout=COALESCE_TIMEOUT_SECONDS, group=_default):
+    """
+    Decorator: concurrent calls with equal arguments share one execution.
+    """
+    if fn is None:
+        return functools.partial(coalesce, timeout=timeout, group=group)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = make_key(fn, args, kwargs)
+        return group.do(key, fn, *args, timeout=timeout, **kwargs)
+
+    return wrapper
@@ -0,0 +1,170 @@
+import io
+
+from flask import send_file
+
+# Rows per Arrow record batch
+BATCH_ROWS = 65536
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class ColumnarUnavailable(Exception):
+    """
+    Raised when a columnar format is requested but pyarrow isn't installed.
+    """
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ColumnarUnavailable("parquet/arrow output needs the pyarrow package")
+    return pa, pq
+
+
+def _as_string(value):
+    return None if value is None else str(value)
+
+
+def _as_float(value):
+    try:
+        return None if value is None or value == "" else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_int(value):
+    try:
+        return None if value is None or value == "" else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_string_list(value):
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    return [_as_string(v) for v in value]
+
+
+# column kind -> (pyarrow type factory, value coercion)
+COLUMN_KINDS = {
+    "string": (lambda pa: pa.string(), _as_string),
+    "category": (lambda pa: pa.dictionary(pa.int32(), pa.string()), _as_string),
+    "float": (lambda pa: pa.float64(), _as_float),
+    "int": (lambda pa: pa.int64(), _as_int),
+    "string_list": (lambda pa: pa.list_(pa.string()), _as_string_list),
+}
+
+# Column layouts per table. "category" columns (company names, dates, places)
+# are dictionary-encoded: each distinct value is stored once.
+EDGAR_POINTS_COLUMNS = [
+    ("datasource_id", "string"),
+    ("raw_id", "string"),
+    ("company_id", "category"),
+    ("company_name", "category"),
+    ("url", "string"),
+    ("date", "category"),
+]
+
+INCOMPLETE_COMPANIES_COLUMNS = [
+    ("_id", "string"),
+    ("name", "string"),
+    ("website", "string"),
+    ("estimated_num_employees", "float"),
+    ("primary_industries", "string_list"),
+    ("annual_revenue", "float"),
+    ("city", "category"),
+    ("state", "category"),
+    ("country", "category"),
+    ("linkedin_url", "string"),
+]
+
+CONTACTS_STATS_COLUMNS = [
+    ("vt_id", "string"),
+    ("company_id", "category"),
+    ("company_name", "category"),
+    ("vt_title", "string"),
+    ("contact_name", "string"),
+    ("contact_email", "string"),
+    ("contact_linkedin_url", "string"),
+    ("contact_id", "string"),
+    ("contact_role", "category"),
+    ("experience_order", "int"),
+]
+
+
+def schema_for(columns):
+    pa, _ = _pyarrow()
+    return pa.schema([(name, COLUMN_KINDS[kind][0](pa)) for name, kind in columns])
+
+
+def record_batches(rows, columns, batch_rows=BATCH_ROWS):
+    """
+    Yield Arrow record batches built column by column from an iterable of row
+    dicts (a list or a live Mongo cursor), batch_rows rows at a time.
+    """
+    pa, _ = _pyarrow()
+    schema = schema_for(columns)
+    coercions = [(name, COLUMN_KINDS[kind][1], kind == "category") for name, kind in columns]
+
+    def build(buffers):
+        arrays = []
+        for (name, _, is_category), values in zip(coercions, buffers):
+            if is_category:
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=schema.field(name).type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    buffers = [[] for _ in columns]
+    count = 0
+    for row in rows:
+        for buffer, (name, coerce, _) in zip(buffers, coercions):
+            buffer.append(coerce(row.get(name)))
+        count += 1
+        if count == batch_rows:
+            yield build(buffers)
+            buffers = [[] for _ in columns]
+            count = 0
+    if count:
+        yield build(buffers)
+
+
+def to_bytes(rows, columns, fmt):
+    """
+    Serialize rows to Parquet (zstd) or an Arrow IPC stream.
+    """
+    pa, pq = _pyarrow()
+    schema = schema_for(columns)
+    output = io.BytesIO()
+    if fmt == "parquet":
+        with pq.ParquetWriter(output, schema, compression="zstd", use_dictionary=True) as writer:
+            for batch in record_batches(rows, columns):
+                writer.write_batch(batch)
+    elif fmt == "arrow":
+        with pa.ipc.new_stream(output, schema) as writer:
+            for batch in record_batches(rows, columns):
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f"unknown columnar format: {fmt}")
+    output.seek(0)
+    return output
+
+
+def columnar_response(rows, columns, fmt, download_name):
+    """
+    Build a send_file response with rows serialized as format=parquet or format=arrow.
+    """
+    mimetype, extension = FORMATS[fmt]
+    return send_file(
+        to_bytes(rows, columns, fmt),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f"{download_name}.{extension}",
+    )
@@ -1,14 +1,70 @@
 from pymongo import MongoClient
+import json
 import os
 from dotenv import load_dotenv
+from metrics import PoolMetricsListener
 
 load_dotenv()
 
 # Environment variables
 MONGO_URI = os.getenv("MONGO_URI")
+# Queries slower than this are logged at WARNING, followed by their explain("executionStats")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+# Slow queries are explained in the background: at most once per query shape per
+# interval, and each explain is capped at this many milliseconds
+SLOW_EXPLAIN_INTERVAL_SECONDS = float(os.getenv("SLOW_EXPLAIN_INTERVAL_SECONDS", 300))
+SLOW_EXPLAIN_MAX_TIME_MS = int(os.getenv("SLOW_EXPLAIN_MAX_TIME_MS", 5000))
+# Enables ?profile=1 on every route for requests that send this secret
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+# Serve /live/* counters from a change stream (needs a replica set and a long-running process)
+LIVE_COUNTERS_ENABLED = os.getenv("LIVE_COUNTERS_ENABLED", "").lower() in ("1", "true", "yes")
+# How long a request waits on an identical in-flight query before giving up
+COALESCE_TIMEOUT_SECONDS = float(os.getenv("COALESCE_TIMEOUT_SECONDS", 30))
+# Service result cache
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 900))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+# "memory" (per process), "sqlite" (shared by workers on one host) or "redis" (shared by all instances)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# SQLite file path or Redis URL for the shared backends
+CACHE_URL = os.getenv("CACHE_URL")
+# How long one process may hold the recompute lock for an entry
+CACHE_LOCK_TIMEOUT_SECONDS = float(os.getenv("CACHE_LOCK_TIMEOUT_SECONDS", 60))
+# Periods (days) the cache warmer precomputes for every graph
+WARM_PERIODS = [int(p) for p in os.getenv("WARM_PERIODS", "7,30,90").split(",")]
+# Timezones (IANA names) the cache warmer precomputes day-bucketed views for
+WARM_TIMEZONES = [tz.strip() for tz in os.getenv("WARM_TIMEZONES", "UTC").split(",") if tz.strip()]
+# Vercel Cron sends this as a bearer token to /cron/warm
+CRON_SECRET = os.getenv("CRON_SECRET")
+# Background export jobs: artifact directory, how long artifacts are kept, worker threads
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/tmp/turf_exports")
+EXPORT_TTL_SECONDS = float(os.getenv("EXPORT_TTL_SECONDS", 3600))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 2))
+# Time budget (ms) shared by all queries of one request, sent to MongoDB as maxTimeMS
+QUERY_BUDGET_MS = int(os.getenv("QUERY_BUDGET_MS", 8000))
+# Per-endpoint overrides, e.g. ENDPOINT_BUDGETS_MS='{"bad_news_model_stats": 20000}'
+ENDPOINT_BUDGETS_MS = {
+    "contacts_stats": 45000,
+    "cron_warm": None,
+    **json.loads(os.getenv("ENDPOINT_BUDGETS_MS", "{}")),
+}
+# Serve dashboard reads from secondaries when the deployment has them
+DASHBOARD_SECONDARY_READS = os.getenv("DASHBOARD_SECONDARY_READS", "").lower() in ("1", "true", "yes")
+# approx=true graphs: documents sampled per metric, and threads computing the exact values behind them
+APPROX_SAMPLE_SIZE = int(os.getenv("APPROX_SAMPLE_SIZE", 5000))
+APPROX_REFINE_WORKERS = int(os.getenv("APPROX_REFINE_WORKERS", 2))
+# Side-collection refreshes (company completeness, contact roles) hold a lock on their
+# state document for at most this long, in case the process running them dies
+REFRESH_LOCK_TTL_SECONDS = float(os.getenv("REFRESH_LOCK_TTL_SECONDS", 900))
+# Reads of a side collection last refreshed longer ago than this queue an incremental
+# refresh in the background (the cron warmer normally keeps them fresher than that)
+SIDE_COLLECTION_STALE_SECONDS = float(os.getenv("SIDE_COLLECTION_STALE_SECONDS", 1800))
+# In-process company_id -> name/status directory: full reload interval, and how often
+# companies changed since the updatedAt watermark are re-read in between
+COMPANY_DIRECTORY_TTL_SECONDS = float(os.getenv("COMPANY_DIRECTORY_TTL_SECONDS", 3600))
+COMPANY_DIRECTORY_REFRESH_SECONDS = float(os.getenv("COMPANY_DIRECTORY_REFRESH_SECONDS", 60))
 
 # MongoDB connection
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[PoolMetricsListener()])
 
 # Global configuration
 DEFAULT_VIEW_RANGE = 30
@@ -0,0 +1,330 @@
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+from flask import jsonify, request, send_file
+
+from config import DEFAULT_VIEW_RANGE, EXPORT_DIR, EXPORT_TTL_SECONDS, EXPORT_WORKERS
+from services.companies_monitor import get_company_monitor
+from services.contacts_monitor import aggregate_contacts_stats
+from services.point_data import get_edgar_data_by_date
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Jobs whose manifest hasn't been touched for this long are restarted on the next request
+ABANDONED_AFTER_SECONDS = 600
+# A running job touches its manifest this often, so long exports aren't taken for abandoned
+HEARTBEAT_SECONDS = 60
+
+
+def write_excel(data, sheet_name, output):
+    """
+    Write rows to a styled worksheet: white-on-blue header, centered cells
+    and columns sized to their longest value.
+
+    Args:
+        data: List of dicts, one per row
+        sheet_name: Worksheet name
+        output: Path or binary file object to write the workbook to
+    """
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    df = pd.DataFrame(data)
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+        worksheet = writer.sheets[sheet_name]
+
+        # Header style
+        header_font = Font(bold=True, color='FFFFFF')
+        header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
+        center_alignment = Alignment(horizontal='center', vertical='center')
+
+        # Apply header style
+        for cell in worksheet[1]:
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = center_alignment
+
+        # Auto-fit column widths and center-align all cells
+        for col in worksheet.columns:
+            max_length = 0
+            col_letter = col[0].column_letter
+            for cell in col:
+                try:
+                    cell.alignment = center_alignment
+                    if cell.value:
+                        max_length = max(max_length, len(str(cell.value)))
+                except Exception:
+                    pass
+            adjusted_width = (max_length + 2)
+            worksheet.column_dimensions[col_letter].width = adjusted_width
+
+
+def _contacts_stats_rows(params):
+    return aggregate_contacts_stats(int(params.get("period", DEFAULT_VIEW_RANGE)))
+
+
+def _edgar_points_rows(params):
+    data = get_edgar_data_by_date(str(params["period"]))
+    if isinstance(data, dict) and "error" in data:
+        raise Exception(data["error"])
+    return data
+
+
+def _incomplete_companies_rows(params):
+    return get_company_monitor().get("data", [])
+
+
+# kind -> (row loader, sheet name, download name template)
+EXPORT_KINDS = {
+    "contacts-stats": (_contacts_stats_rows, "ContactsStats", "contacts_stats_{period}_days.xlsx"),
+    "edgar-points": (_edgar_points_rows, "EdgarPoints", "edgar_points_{period}.xlsx"),
+    "incomplete-companies": (_incomplete_companies_rows, "IncompleteCompanies", "incomplete_companies.xlsx"),
+}
+
+
+class ExportJobs:
+    """
+    Background export jobs with progress, stored as a JSON manifest plus the
+    finished artifact in EXPORT_DIR.
+
+    A job's id is derived from its kind and parameters, so requesting the same
+    export again returns the existing job (and its artifact) until it expires.
+    """
+
+    def __init__(self, directory=EXPORT_DIR, ttl=EXPORT_TTL_SECONDS, workers=EXPORT_WORKERS):
+        self.directory = directory
+        self.ttl = ttl
+        self._save_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def job_id(kind, params):
+        normalized = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha1(normalized.encode()).hexdigest()[:20]
+
+    def _manifest_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.xlsx")
+
+    def get(self, job_id):
+        """
+        Return a job's manifest, or None if it doesn't exist or has expired.
+        """
+        try:
+            with open(self._manifest_path(job_id)) as f:
+                job = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if job.get("expires_at") and job["expires_at"] < time.time():
+            self._remove(job_id)
+            return None
+        return job
+
+    def _save(self, job):
+        with self._save_lock:
+            job["updated_at"] = time.time()
+            path = self._manifest_path(job["id"])
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp_path, path)
+
+    def _update(self, job, **fields):
+        with self._save_lock:
+            job.update(fields)
+        self._save(job)
+
+    @contextmanager
+    def _job_lock(self, job_id):
+        """
+        Hold an exclusive lock on a job across every process sharing EXPORT_DIR.
+        """
+        with open(os.path.join(self.directory, f"{job_id}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _heartbeat(self, job):
+        """
+        Re-save the manifest every HEARTBEAT_SECONDS while the block runs.
+        """
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(HEARTBEAT_SECONDS):
+                self._save(job)
+
+        thread = threading.Thread(target=beat, name=f"export-heartbeat-{job['id']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def _remove(self, job_id):
+        for path in (self._manifest_path(job_id), self.artifact_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _abandoned(job):
+        # A worker that died (e.g. the instance was recycled) leaves its job queued/running forever
+        return job["status"] in ("queued", "running") and time.time() - job.get("updated_at", 0) > ABANDONED_AFTER_SECONDS
+
+    def purge_expired(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self.get(name[:-len(".json")])
+
+    def create(self, kind, params):
+        """
+        Start an export, or return the existing job for the same kind and params.
+
+        Returns:
+            (job manifest, created) where created is False when an existing job was reused
+        """
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"unknown export kind: {kind}")
+        if kind == "edgar-points" and "period" not in params:
+            raise ValueError("edgar-points needs a period (MM/DD/YYYY)")
+
+        job_id = self.job_id(kind, params)
+        with self._job_lock(job_id):
+            job = self.get(job_id)
+            if job is not None and job["status"] != "failed" and not self._abandoned(job):
+                return job, False
+            self.purge_expired()
+            job = {
+                "id": job_id,
+                "kind": kind,
+                "params": params,
+                "run_id": uuid.uuid4().hex,
+                "status": "queued",
+                "progress": 0.0,
+                "message": "queued",
+                "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                "finished_at": None,
+                "expires_at": None,
+                "rows": None,
+                "size_bytes": None,
+                "error": None,
+            }
+            self._save(job)
+        self._executor.submit(self._run, dict(job))
+        return job, True
+
+    def _run(self, job):
+        load_rows, sheet_name, _ = EXPORT_KINDS[job["kind"]]
+        # Each run writes its own file, so a restarted job never shares one with the run it replaced
+        tmp_path = os.path.join(self.directory, f"{job['id']}.{job['run_id']}.tmp.xlsx")
+        try:
+            with self._heartbeat(job):
+                self._update(job, status="running", progress=0.1, message="querying")
+                rows = load_rows(job["params"])
+                self._update(job, progress=0.6, message=f"building workbook ({len(rows)} rows)", rows=len(rows))
+                write_excel(rows, sheet_name, tmp_path)
+            os.replace(tmp_path, self.artifact_path(job["id"]))
+
+            self._update(
+                job,
+                status="done",
+                progress=1.0,
+                message="done",
+                finished_at=datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                expires_at=time.time() + self.ttl,
+                size_bytes=os.path.getsize(self.artifact_path(job["id"])),
+            )
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._update(
+                job,
+                status="failed",
+                message="failed",
+                error=str(e),
+                finished_at=datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            )
+
+    def download_name(self, job):
+        _, _, template = EXPORT_KINDS[job["kind"]]
+        params = {"period": DEFAULT_VIEW_RANGE, **job["params"]}
+        return template.format(**params).replace("/", "-")
+
+
+def init_app(app, jobs=None):
+    """
+    Register the export job API:
+        POST /exports                      {"kind": ..., "params": {...}} -> job
+        GET  /exports/<job_id>             job status and progress
+        GET  /exports/<job_id>/download    the finished workbook
+    """
+    jobs = jobs or ExportJobs()
+
+    def _job_response(job):
+        return {
+            **job,
+            "status_url": f"/exports/{job['id']}",
+            "download_url": f"/exports/{job['id']}/download" if job["status"] == "done" else None,
+        }
+
+    @app.route('/exports', methods=['POST'])
+    def create_export():
+        try:
+            body = request.get_json(silent=True) or {}
+            job, created = jobs.create(body.get("kind"), body.get("params") or {})
+            return jsonify(_job_response(job)), 202 if created else 200
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/exports/<job_id>', methods=['GET'])
+    def export_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "export not found"}), 404
+        return jsonify(_job_response(job))
+
+    @app.route('/exports/<job_id>/download', methods=['GET'])
+    def export_download(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "export not found"}), 404
+        if job["status"] != "done":
+            return jsonify({"error": f"export is {job['status']}", "progress": job["progress"]}), 409
+        return send_file(
+            jobs.artifact_path(job_id),
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=jobs.download_name(job),
+        )
+
+    return app
+
+
+def excel_response(data, sheet_name, download_name):
+    """
+    Build a send_file response with the rows written as a styled workbook.
+    """
+    output = io.BytesIO()
+    write_excel(data, sheet_name, output)
+    output.seek(0)
+    return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=download_name)
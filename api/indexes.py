@@ -0,0 +1,65 @@
+from pymongo import ASCENDING, DESCENDING
+
+# Indexes the service queries rely on, per database and collection.
+# Each entry is (keys, options) as accepted by create_index.
+INDEXES = {
+    "turf_mvp": {
+        "contacts": [
+            ([("createdAt", ASCENDING)], {}),
+            ([("email", ASCENDING), ("createdAt", ASCENDING)], {}),
+            ([("updatedAt", ASCENDING)], {}),
+        ],
+        "datasources": [
+            ([("type", ASCENDING), ("status", ASCENDING), ("createdAt", ASCENDING)], {}),
+            ([("raw_source_id", ASCENDING)], {}),
+        ],
+        "loggers": [
+            ([("source_type", ASCENDING), ("status", ASCENDING), ("createdAt", ASCENDING)], {}),
+            ([("company_id", ASCENDING), ("step", ASCENDING), ("createdAt", ASCENDING)], {}),
+        ],
+        "companies": [
+            ([("status", ASCENDING), ("name", ASCENDING)], {}),
+            ([("has_bad_news_source", ASCENDING)], {}),
+            ([("updatedAt", ASCENDING)], {}),
+        ],
+        "company_completeness": [
+            ([("mask", ASCENDING), ("incompleteAt", ASCENDING)], {}),
+            ([("mask", ASCENDING), ("fixedAt", ASCENDING)], {}),
+        ],
+        "companyvaluetriggers": [
+            ([("createdAt", DESCENDING)], {}),
+        ],
+        "status": [
+            ([("type", ASCENDING), ("name", ASCENDING), ("createdAt", ASCENDING)], {}),
+        ],
+    },
+    "turf_prototype": {
+        "scrapper": [([("createdAt", ASCENDING)], {})],
+        "theirstack": [([("createdAt", ASCENDING)], {})],
+        "koyfin_transcript": [([("createdAt", ASCENDING)], {})],
+        "edgar_file": [([("createdAt", ASCENDING)], {})],
+    },
+}
+
+
+def ensure_indexes(client):
+    """
+    Create every index in INDEXES. Safe to run repeatedly.
+
+    Returns:
+        List of "db.collection.index_name" strings that were ensured
+    """
+    created = []
+    for db_name, collections in INDEXES.items():
+        for col_name, indexes in collections.items():
+            collection = client[db_name][col_name]
+            for keys, options in indexes:
+                name = collection.create_index(keys, **options)
+                created.append(f"{db_name}.{col_name}.{name}")
+    return created
+
+
+if __name__ == "__main__":
+    from config import client
+    for name in ensure_indexes(client):
+        print(name)
@@ -0,0 +1,321 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, has_request_context, request
+
+from pymongo.errors import ExecutionTimeout
+
+from budget import query_options, remaining_ms
+from config import SLOW_EXPLAIN_INTERVAL_SECONDS, SLOW_EXPLAIN_MAX_TIME_MS, SLOW_QUERY_MS
+from metrics import QUERY_DOCS, QUERY_LATENCY, QUERY_TIMEOUTS
+
+logger = logging.getLogger("turf_monitor.queries")
+
+_captured = ContextVar("captured_queries", default=None)
+
+
+def pipeline_shape(pipeline):
+    """
+    Describe a pipeline by its stage names, e.g. "$match>$group>$sort".
+    """
+    return ">".join(next(iter(stage), "?") for stage in pipeline)
+
+
+def _request_queries():
+    if not has_request_context():
+        return None
+    if "queries" not in g:
+        g.queries = []
+    return g.queries
+
+
+def _explain(collection, command):
+    try:
+        return collection.database.command("explain", command, verbosity="executionStats")
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class SlowQueryExplainer:
+    """
+    Explains slow queries on a background thread so the request that ran them
+    isn't slowed down further. Each query shape is explained at most once per
+    interval, and the explain gets the request's remaining budget (capped at
+    max_time_ms) as maxTimeMS.
+    """
+
+    def __init__(self, interval=SLOW_EXPLAIN_INTERVAL_SECONDS, max_time_ms=SLOW_EXPLAIN_MAX_TIME_MS):
+        self.interval = interval
+        self.max_time_ms = max_time_ms
+        self._lock = threading.Lock()
+        self._last = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-explain")
+
+    def submit(self, entry, collection, command):
+        """
+        Queue an explain for a slow query unless its shape was explained recently.
+
+        Returns:
+            True if an explain was queued
+        """
+        shape = (entry["label"], entry["namespace"], entry["op"], entry["shape"])
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(shape, float("-inf")) < self.interval:
+                return False
+            self._last[shape] = now
+        budget_ms = remaining_ms()
+        max_time_ms = self.max_time_ms if budget_ms is None else max(1, min(budget_ms, self.max_time_ms))
+        self._executor.submit(self._run, dict(entry), collection, {**command, "maxTimeMS": max_time_ms})
+        return True
+
+    def _run(self, entry, collection, command):
+        logger.warning(json.dumps({**entry, "explain": _explain(collection, command)}, default=str))
+
+
+slow_explainer = SlowQueryExplainer()
+
+
+def record_query(label, collection, op, duration_ms, docs, shape, explain_command=None):
+    """
+    Record a finished query for the current request and emit a structured log line.
+
+    Args:
+        label: Name of the service function that issued the query
+        collection: Collection the query ran against
+        op: "aggregate", "find", "find_one" or "count"
+        duration_ms: Wall-clock time spent in MongoDB (including cursor iteration)
+        docs: Number of documents returned
+        shape: Short description of the query (stage names or filter keys)
+        explain_command: Command document used to explain the query, in the
+            background, if it is slow
+    """
+    entry = {
+        "label": label,
+        "namespace": collection.full_name,
+        "op": op,
+        "duration_ms": round(duration_ms, 2),
+        "docs": docs,
+        "shape": shape,
+    }
+
+    QUERY_LATENCY.observe(duration_ms / 1000, function=label, op=op, namespace=collection.full_name)
+    QUERY_DOCS.inc(docs, function=label, op=op)
+
+    queries = _request_queries()
+    if queries is not None:
+        queries.append(entry)
+
+    captured = _captured.get()
+    if captured is not None:
+        captured.append({**entry, "collection": collection, "command": explain_command})
+
+    if duration_ms >= SLOW_QUERY_MS:
+        entry["slow"] = True
+        logger.warning(json.dumps(entry, default=str))
+        if explain_command is not None:
+            # Logged as a second line once the background explain finishes
+            slow_explainer.submit(entry, collection, explain_command)
+    else:
+        logger.info(json.dumps(entry, default=str))
+
+    return entry
+
+
+def record_timeout(label, collection, op, duration_ms, error):
+    """
+    Count and log a query that was stopped by its time budget.
+    """
+    QUERY_TIMEOUTS.inc(function=label, namespace=collection.full_name)
+    logger.warning(json.dumps({
+        "label": label,
+        "namespace": collection.full_name,
+        "op": op,
+        "duration_ms": round(duration_ms, 2),
+        "timed_out": True,
+        "error": str(error),
+    }))
+
+
+@contextmanager
+def capture_queries():
+    """
+    Collect every query issued inside the block, together with the command
+    needed to explain it. Used by the query-plan checks in bench/plan_check.py.
+    """
+    captured = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+def aggregate(collection, pipeline, label, **kwargs):
+    """
+    Run collection.aggregate and return the results as a list, recording timing.
+    """
+    collection, max_time_ms = query_options(collection)
+    if max_time_ms is not None:
+        kwargs.setdefault("maxTimeMS", max_time_ms)
+    start = time.perf_counter()
+    try:
+        results = list(collection.aggregate(pipeline, **kwargs))
+    except ExecutionTimeout as e:
+        record_timeout(label, collection, "aggregate", (time.perf_counter() - start) * 1000, e)
+        raise
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    record_query(
+        label, collection, "aggregate", duration_ms, len(results), pipeline_shape(pipeline),
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+    )
+    return results
+
+
+def iter_aggregate(collection, pipeline, label, **kwargs):
+    """
+    Stream collection.aggregate results, recording timing once the cursor is exhausted.
+    The recorded duration includes the time the consumer spends between documents.
+    """
+    collection, max_time_ms = query_options(collection)
+    if max_time_ms is not None:
+        kwargs.setdefault("maxTimeMS", max_time_ms)
+    start = time.perf_counter()
+    docs = 0
+    try:
+        for doc in collection.aggregate(pipeline, **kwargs):
+            docs += 1
+            yield doc
+    except ExecutionTimeout as e:
+        record_timeout(label, collection, "aggregate", (time.perf_counter() - start) * 1000, e)
+        raise
+    duration_ms = (time.perf_counter() - start) * 1000
+    record_query(
+        label, collection, "aggregate", duration_ms, docs, pipeline_shape(pipeline),
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+    )
+
+
+def find(collection, query, projection=None, label=None, **kwargs):
+    """
+    Run collection.find and return the results as a list, recording timing.
+    """
+    collection, max_time_ms = query_options(collection)
+    if max_time_ms is not None:
+        kwargs.setdefault("max_time_ms", max_time_ms)
+    start = time.perf_counter()
+    try:
+        results = list(collection.find(query, projection, **kwargs))
+    except ExecutionTimeout as e:
+        record_timeout(label, collection, "find", (time.perf_counter() - start) * 1000, e)
+        raise
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    command = {"find": collection.name, "filter": query}
+    if projection:
+        command["projection"] = projection
+    record_query(label, collection, "find", duration_ms, len(results), ",".join(query), command)
+    return results
+
+
+def find_one(collection, query, projection=None, label=None, **kwargs):
+    """
+    Run collection.find_one, recording timing.
+    """
+    collection, max_time_ms = query_options(collection)
+    if max_time_ms is not None:
+        kwargs.setdefault("max_time_ms", max_time_ms)
+    start = time.perf_counter()
+    try:
+        result = collection.find_one(query, projection, **kwargs)
+    except ExecutionTimeout as e:
+        record_timeout(label, collection, "find_one", (time.perf_counter() - start) * 1000, e)
+        raise
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    command = {"find": collection.name, "filter": query, "limit": 1}
+    if projection:
+        command["projection"] = projection
+    record_query(
+        label, collection, "find_one", duration_ms, 0 if result is None else 1, ",".join(query), command,
+    )
+    return result
+
+
+def estimated_document_count(collection, label):
+    """
+    Run collection.estimated_document_count (collection metadata, no scan), recording timing.
+    """
+    collection, max_time_ms = query_options(collection)
+    kwargs = {} if max_time_ms is None else {"maxTimeMS": max_time_ms}
+    start = time.perf_counter()
+    try:
+        count = collection.estimated_document_count(**kwargs)
+    except ExecutionTimeout as e:
+        record_timeout(label, collection, "count", (time.perf_counter() - start) * 1000, e)
+        raise
+    duration_ms = (time.perf_counter() - start) * 1000
+    record_query(label, collection, "count", duration_ms, 1, "estimated")
+    return count
+
+
+def server_timing_header(queries, total_ms=None):
+    """
+    Build a Server-Timing header value from the queries recorded for a request.
+
+    Queries are grouped by label, namespace and operation so that per-document
+    lookups don't produce one header entry each.
+    """
+    groups = {}
+    for query in queries:
+        key = (query["label"], query["namespace"], query["op"])
+        duration, count = groups.get(key, (0, 0))
+        groups[key] = (duration + query["duration_ms"], count + 1)
+
+    metrics = []
+    for i, ((label, namespace, op), (duration, count)) in enumerate(groups.items()):
+        desc = f"{label} {op} {namespace} x{count}".replace('"', "'")
+        metrics.append(f'q{i + 1};dur={round(duration, 2)};desc="{desc}"')
+    db_total = sum(duration for duration, _ in groups.values())
+    metrics.append(f"db;dur={round(db_total, 2)}")
+    if total_ms is not None:
+        metrics.append(f"app;dur={round(total_ms, 2)}")
+    return ", ".join(metrics)
+
+
+def init_app(app):
+    """
+    Attach per-request timing to a Flask app: each response gets a Server-Timing
+    header listing the queries it ran, and a summary log line is written.
+    """
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+        g.queries = []
+
+    @app.after_request
+    def _add_server_timing(response):
+        start = g.get("request_start")
+        if start is None:
+            return response
+        total_ms = (time.perf_counter() - start) * 1000
+        queries = g.get("queries", [])
+        response.headers["Server-Timing"] = server_timing_header(queries, total_ms)
+        logger.info(json.dumps({
+            "path": request.full_path.rstrip("?"),
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 2),
+            "db_ms": round(sum(q["duration_ms"] for q in queries), 2),
+            "queries": len(queries),
+        }))
+        return response
+
+    return app
+
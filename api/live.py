@@ -0,0 +1,337 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import Response, jsonify, request, stream_with_context
+from pymongo.errors import PyMongoError
+
+from catalog import GRAPHS
+from config import LIVE_COUNTERS_ENABLED, client
+
+logger = logging.getLogger("turf_monitor.live")
+
+SSE_HEARTBEAT_SECONDS = 15
+WATCH_AWAIT_MS = 1000
+RESTART_DELAY_SECONDS = 5
+
+# Operators matches() understands; catalog filters using others can't be counted live
+SUPPORTED_OPERATORS = {"$in", "$nin", "$ne", "$exists"}
+
+
+def _has_multiple_active_experiences(doc):
+    experiences = (doc.get("coresignal_data") or {}).get("experience") or []
+    return sum(1 for exp in experiences if exp.get("active_experience") == 1) > 1
+
+
+# Catalog counters other than count_data_by_day, as (db, collection, filter, predicate, projection)
+DEDICATED_COUNTERS = {
+    "count_contacts_data_by_day": (
+        "turf_mvp", "contacts", {}, _has_multiple_active_experiences,
+        {"coresignal_data.experience.active_experience": 1},
+    ),
+}
+
+
+def live_counters(graphs=GRAPHS):
+    """
+    Build the live counters from the metric catalog.
+
+    Returns:
+        List of (graph, metric, db, collection, filter, predicate, projection)
+
+    Raises:
+        ValueError: A catalog metric can't be counted from the change stream
+    """
+    counters = []
+    for plan in graphs.values():
+        for metric in plan.metrics:
+            if metric.counter == "count_data_by_day":
+                query = metric.match.to_dict()
+                operators = {op for condition in query.values() if isinstance(condition, dict) for op in condition}
+                if not operators <= SUPPORTED_OPERATORS:
+                    raise ValueError(f"{plan.name}.{metric.name}: live counters don't support {sorted(operators - SUPPORTED_OPERATORS)}")
+                counters.append((plan.name, metric.name, metric.db_name, metric.col_name, query, None, None))
+            elif metric.counter in DEDICATED_COUNTERS:
+                counters.append((plan.name, metric.name, *DEDICATED_COUNTERS[metric.counter]))
+            else:
+                raise ValueError(f"{plan.name}.{metric.name}: no live counter for {metric.counter}")
+    return counters
+
+
+LIVE_COUNTERS = live_counters()
+
+# graph -> its ratio metrics, computed from the counted ones
+RATIOS = {name: plan.ratios for name, plan in GRAPHS.items() if plan.ratios}
+
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def matches(doc, query):
+    """
+    Evaluate the small subset of MongoDB query syntax the counter filters use:
+    equality (None matches null or missing), $in, $nin, $ne and $exists.
+    """
+    for field, condition in query.items():
+        value = _get_path(doc, field)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$exists" and (value is not None) != bool(operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _day_bounds(now=None):
+    now = now or datetime.utcnow()
+    start = datetime(now.year, now.month, now.day)
+    return start, start + timedelta(days=1)
+
+
+class LiveCounters:
+    """
+    Today's (UTC) per-graph counters, kept current from a change stream.
+
+    Each counter holds the _ids of today's documents that match its filter so
+    that inserts, updates that move a document in or out of the filter, and
+    deletes can all be applied exactly.
+    """
+
+    def __init__(self, mongo_client, counters=LIVE_COUNTERS):
+        self.client = mongo_client
+        self.counters = counters
+        self.members = [set() for _ in counters]
+        self.day = None
+        self.version = 0
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._resume_token = None
+
+    def _namespaces(self):
+        return sorted({(db, col) for _, _, db, col, _, _, _ in self.counters})
+
+    def reset(self):
+        """
+        Reload today's members for every counter with one indexed query each.
+        """
+        start, end = _day_bounds()
+        members = []
+        for _, _, db_name, col_name, query, predicate, projection in self.counters:
+            cursor = self.client[db_name][col_name].find(
+                {**query, "createdAt": {"$gte": start, "$lt": end}},
+                projection or {"_id": 1},
+            )
+            members.append({doc["_id"] for doc in cursor if predicate is None or predicate(doc)})
+        with self._changed:
+            self.members = members
+            self.day = start
+            self.version += 1
+            self._changed.notify_all()
+
+    def apply_change(self, change):
+        """
+        Apply one change stream event. Returns True if any counter moved.
+        """
+        ns = change.get("ns", {})
+        namespace = (ns.get("db"), ns.get("coll"))
+        doc_id = change.get("documentKey", {}).get("_id")
+        doc = change.get("fullDocument")
+        start, end = _day_bounds()
+        moved = False
+
+        with self._changed:
+            if self.day != start:
+                return False
+            for i, (_, _, db_name, col_name, query, predicate, _) in enumerate(self.counters):
+                if (db_name, col_name) != namespace:
+                    continue
+                included = (
+                    doc is not None
+                    and isinstance(doc.get("createdAt"), datetime)
+                    and start <= doc["createdAt"] < end
+                    and matches(doc, query)
+                    and (predicate is None or predicate(doc))
+                )
+                members = self.members[i]
+                if included and doc_id not in members:
+                    members.add(doc_id)
+                    moved = True
+                elif not included and doc_id in members:
+                    members.discard(doc_id)
+                    moved = True
+            if moved:
+                self.version += 1
+                self._changed.notify_all()
+        return moved
+
+    def snapshot(self, graph=None):
+        """
+        Current counts shaped like the /graph/* "data" entries for today.
+        """
+        with self._changed:
+            counts = [len(m) for m in self.members]
+            day = self.day
+            version = self.version
+        graphs = {}
+        for (graph_name, metric, *_), count in zip(self.counters, counts):
+            if graph is None or graph == graph_name:
+                graphs.setdefault(graph_name, {})[metric] = count
+        for graph_name, metrics in graphs.items():
+            for ratio in RATIOS.get(graph_name, ()):
+                numerator, denominator = metrics.get(ratio.numerator, 0), metrics.get(ratio.denominator, 0)
+                metrics[ratio.name] = round((numerator / denominator) * 100, 2) if denominator else 0
+        return {
+            "_id": day.strftime("%Y-%m-%d") if day else None,
+            "version": version,
+            "graphs": graphs,
+        }
+
+    def wait_for_change(self, version, timeout):
+        """
+        Block until the version moves past `version` or `timeout` seconds pass.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version or self._stop.is_set(), timeout)
+            return self.version
+
+    def _watch_once(self):
+        namespaces = self._namespaces()
+        pipeline = [{"$match": {
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+            "$or": [{"ns.db": db, "ns.coll": col} for db, col in namespaces],
+        }}]
+        with self.client.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=WATCH_AWAIT_MS,
+        ) as stream:
+            if self._resume_token is None or self.day is None:
+                self.reset()
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if _day_bounds()[0] != self.day:
+                    self.reset()
+                if change is None:
+                    continue
+                self._resume_token = stream.resume_token
+                self.apply_change(change)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._watch_once()
+            except PyMongoError as e:
+                logger.warning(f"live counters change stream failed, restarting: {e}")
+                # The resume token may have expired from the oplog; start over from a fresh count
+                self._resume_token = None
+                self._stop.wait(RESTART_DELAY_SECONDS)
+
+    def start(self):
+        """
+        Start the background watcher thread if it isn't running yet.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-counters", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_live_counters = None
+_start_lock = threading.Lock()
+
+
+def get_live_counters():
+    """
+    The process-wide LiveCounters, started on first use.
+    """
+    global _live_counters
+    with _start_lock:
+        if _live_counters is None:
+            _live_counters = LiveCounters(client).start()
+    return _live_counters
+
+
+def sse_events(counters, graph=None, heartbeat=SSE_HEARTBEAT_SECONDS):
+    """
+    Yield server-sent events: a snapshot on connect and after every change,
+    with a comment line as heartbeat so proxies keep the connection open.
+    """
+    version = None
+    while True:
+        snapshot = counters.snapshot(graph)
+        if snapshot["version"] != version:
+            version = snapshot["version"]
+            yield f"id: {version}\nevent: counters\ndata: {json.dumps(snapshot)}\n\n"
+        else:
+            yield ": heartbeat\n\n"
+        counters.wait_for_change(version, heartbeat)
+
+
+def init_app(app):
+    """
+    Register /live/counters (JSON snapshot) and /live/stream (SSE). Disabled
+    unless LIVE_COUNTERS_ENABLED is set, since it needs a replica set and a
+    long-running process.
+    """
+
+    @app.route("/live/counters", methods=["GET"])
+    def live_counters():
+        if not LIVE_COUNTERS_ENABLED:
+            return jsonify({"error": "live counters are disabled"}), 404
+        try:
+            return jsonify(get_live_counters().snapshot(request.args.get("graph")))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/live/stream", methods=["GET"])
+    def live_stream():
+        if not LIVE_COUNTERS_ENABLED:
+            return jsonify({"error": "live counters are disabled"}), 404
+        counters = get_live_counters()
+        return Response(
+            stream_with_context(sse_events(counters, request.args.get("graph"))),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    # Against a local single-node replica set:
+    #   mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+    #   MONGO_URI="mongodb://localhost:27017/?replicaSet=rs0" python api/live.py
+    from pprint import pprint
+    counters = LiveCounters(client).start()
+    version = None
+    try:
+        while True:
+            version = counters.wait_for_change(version, 30)
+            pprint(counters.snapshot())
+    except KeyboardInterrupt:
+        counters.stop()
@@ -0,0 +1,252 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Metric:
+    """
+    Base class for an in-process metric family with a fixed set of label names.
+    """
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def snapshot(self):
+        """
+        A consistent copy of every label set's value, taken under the lock.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.snapshot().items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        # Bucket counts are updated in place, so copy them too
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    def _render_sample(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels + ("le",), key + (bound,))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("route", "method", "status"))
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response payload size by route.", ("route",), SIZE_BUCKETS)
+QUERY_LATENCY = Histogram(
+    "service_query_duration_seconds", "MongoDB query duration by service function.", ("function", "op", "namespace"))
+QUERY_DOCS = Counter(
+    "service_query_documents_total", "Documents returned by service function queries.", ("function", "op"))
+QUERY_TIMEOUTS = Counter(
+    "service_query_timeouts_total", "Queries stopped by their time budget (maxTimeMS).", ("function", "namespace"))
+POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool.", ("address",), POOL_WAIT_BUCKETS)
+POOL_CHECKOUT_FAILED = Counter(
+    "mongo_pool_checkout_failed_total", "Failed pool checkouts by reason.", ("address", "reason"))
+POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use", "Connections currently checked out of the pool.", ("address",))
+POOL_OPEN = Gauge(
+    "mongo_pool_connections_open", "Connections currently open in the pool.", ("address",))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+
+
+def record_cache(cache, hit):
+    """
+    Count a lookup against an in-process cache.
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _render_cache_ratios():
+    # One snapshot, so each ratio's hits and misses are read together
+    requests = CACHE_REQUESTS.snapshot()
+    caches = sorted({cache for cache, _ in requests})
+    lines = ["# HELP cache_hit_ratio Share of cache lookups that were hits.", "# TYPE cache_hit_ratio gauge"]
+    for cache in caches:
+        hits = requests.get((cache, "hit"), 0)
+        total = hits + requests.get((cache, "miss"), 0)
+        lines.append(f"cache_hit_ratio{_format_labels(('cache',), (cache,))} {hits / total if total else 0}")
+    return lines
+
+
+def render():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_render_cache_ratios())
+    return "\n".join(lines) + "\n"
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Feeds MongoClient connection pool events into the pool metrics.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _address(self, event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "checkout_started", None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, address=self._address(event))
+            self._local.checkout_started = None
+        POOL_IN_USE.inc(address=self._address(event))
+
+    def connection_check_out_failed(self, event):
+        self._local.checkout_started = None
+        POOL_CHECKOUT_FAILED.inc(address=self._address(event), reason=event.reason)
+
+    def connection_checked_in(self, event):
+        POOL_IN_USE.dec(address=self._address(event))
+
+    def connection_created(self, event):
+        POOL_OPEN.inc(address=self._address(event))
+
+    def connection_closed(self, event):
+        POOL_OPEN.dec(address=self._address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        POOL_IN_USE.set(0, address=self._address(event))
+        POOL_OPEN.set(0, address=self._address(event))
+
+
+def init_app(app):
+    """
+    Record per-route latency and payload size, and serve everything at /metrics.
+    """
+    @app.before_request
+    def _start_metrics_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = g.get("metrics_start")
+        if start is None or request.endpoint == "metrics":
+            return response
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_SIZE.observe(size, route=route)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,99 @@
+import cProfile
+import hmac
+import pstats
+import time
+
+from flask import g, jsonify, request
+
+from config import PROFILE_SECRET
+
+# Modules whose time counts as waiting on MongoDB rather than Python work
+MONGO_MODULES = ("pymongo", "bson", "socket", "ssl", "selectors")
+TOP_FUNCTIONS = 40
+
+
+def profiling_requested():
+    """
+    True if the current request asked for ?profile=1 and carries the profile secret.
+    """
+    if not PROFILE_SECRET or request.args.get("profile") != "1":
+        return False
+    token = request.headers.get("X-Profile-Token") or request.args.get("profile_token", "")
+    return hmac.compare_digest(token.encode(), PROFILE_SECRET.encode())
+
+
+def _category(filename, name):
+    for module in MONGO_MODULES:
+        if f"/{module}" in filename or f"_{module}" in name or f"'{module}" in name:
+            return "mongodb"
+    return "python"
+
+
+def summarize_profile(profiler, total_ms, queries):
+    """
+    Turn a finished cProfile run into a JSON-friendly call tree.
+
+    Args:
+        profiler: Disabled cProfile.Profile for the request
+        total_ms: Wall-clock duration of the request
+        queries: Queries recorded by the instrumentation layer for the request
+
+    Returns:
+        Dict with the Python/MongoDB time split and the top functions by cumulative time
+    """
+    stats = pstats.Stats(profiler)
+    functions = []
+    mongo_self_ms = 0
+    for (filename, line, name), (_, ncalls, tottime, cumtime, callers) in stats.stats.items():
+        category = _category(filename, name)
+        if category == "mongodb":
+            mongo_self_ms += tottime * 1000
+        functions.append({
+            "function": f"{filename}:{line}({name})",
+            "category": category,
+            "ncalls": ncalls,
+            "self_ms": round(tottime * 1000, 3),
+            "cumulative_ms": round(cumtime * 1000, 3),
+            "callers": sorted(f"{c[0]}:{c[1]}({c[2]})" for c in callers),
+        })
+    functions.sort(key=lambda f: f["cumulative_ms"], reverse=True)
+
+    mongo_ms = sum(q["duration_ms"] for q in queries)
+    return {
+        "total_ms": round(total_ms, 2),
+        "mongodb_ms": round(mongo_ms, 2),
+        "mongodb_self_ms": round(mongo_self_ms, 2),
+        "python_ms": round(max(total_ms - mongo_ms, 0), 2),
+        "queries": queries,
+        "functions": functions[:TOP_FUNCTIONS],
+    }
+
+
+def init_app(app):
+    """
+    Let any route be profiled with ?profile=1. Disabled unless PROFILE_SECRET is set;
+    the request must send the secret as X-Profile-Token or ?profile_token=.
+    The normal response is replaced by the profile.
+    """
+
+    @app.before_request
+    def _start_profiler():
+        if not profiling_requested():
+            return
+        g.profile_start = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def _finish_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        total_ms = (time.perf_counter() - g.pop("profile_start")) * 1000
+        profile = summarize_profile(profiler, total_ms, g.get("queries", []))
+        profile["response_status"] = response.status_code
+        profile["response_bytes"] = response.calculate_content_length()
+        return jsonify({"profile": profile})
+
+    return app
@@ -0,0 +1,37 @@
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from config import REFRESH_LOCK_TTL_SECONDS
+
+
+@contextmanager
+def refresh_lock(state_col, state_id, ttl=REFRESH_LOCK_TTL_SECONDS):
+    """
+    Hold a lock on a side collection's state document while refreshing it,
+    so only one process at a time (CLI, cron or another instance) runs the
+    refresh. A lock left behind by a dead process expires after ttl seconds.
+
+    Yields:
+        True if this caller holds the lock, False if another refresh does
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    try:
+        # Matches only an unlocked or expired state document; if it exists but
+        # is locked, the upsert collides on _id
+        state_col.update_one(
+            {"_id": state_id, "$or": [{"lockedUntil": {"$exists": False}}, {"lockedUntil": {"$lt": now}}]},
+            {"$set": {"lockedUntil": now + timedelta(seconds=ttl), "lockToken": token}},
+            upsert=True,
+        )
+        held = True
+    except DuplicateKeyError:
+        held = False
+    try:
+        yield held
+    finally:
+        if held:
+            state_col.update_one({"_id": state_id, "lockToken": token}, {"$unset": {"lockedUntil": "", "lockToken": ""}})
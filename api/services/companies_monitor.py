@@ -1,67 +1,328 @@
-from pymongo import MongoClient
-from config import client  # your configured client
+from datetime import datetime, timedelta
+from itertools import islice
 
-def get_company_monitor():
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from background import refreshers
+from config import SIDE_COLLECTION_STALE_SECONDS, client  # your configured client
+from instrumentation import aggregate, find, find_one, iter_aggregate
+from refresh_lock import refresh_lock
+
+INCOMPLETE_MATCH = {
+    "$or": [
+        { "estimated_num_employees": None },
+        { "primary_industries": [] },
+        { "annual_revenue": None },
+        { "city": None },
+        { "state": None },
+        { "country": None },
+        { "website": None },
+        { "linkedin_url": None },
+        
+    ],
+    "status": "Active"
+}
+
+INCOMPLETE_PROJECTION = {
+    "_id": 1,
+    "name": 1,
+    "website": { "$ifNull": ["$website", None] },
+    "estimated_num_employees": { "$ifNull": ["$estimated_num_employees", None] },
+    "primary_industries": { "$ifNull": ["$primary_industries", None] },
+    "annual_revenue": { "$ifNull": ["$annual_revenue", None] },
+    "city": { "$ifNull": ["$city", None] },
+    "state": { "$ifNull": ["$state", None] },
+    "country": { "$ifNull": ["$country", None] },
+    "linkedin_url": { "$ifNull": ["$linkedin_url", None] }
+}
+
+# Completeness tracker: one document per company that has ever been incomplete,
+# plus a state document with the updatedAt watermark and the refresh lock
+TRACKER_COLLECTION = "company_completeness"
+STATE_COLLECTION = "company_completeness_state"
+STATE_ID = "companies"
+TRACKER_BATCH_SIZE = 1000
+
+# Bit i of a company's mask is set when COMPLETENESS_FIELDS[i] has its "missing" value
+COMPLETENESS_FIELDS = [(field, value) for clause in INCOMPLETE_MATCH["$or"] for field, value in clause.items()]
+ROW_FIELDS = [field for field in INCOMPLETE_PROJECTION if field != "_id"]
+
+
+class TrackerNotBuilt(Exception):
+    """
+    Raised by reads of the completeness tracker before its first refresh has
+    run, when an empty tracker would look like "no incomplete companies".
+    """
+
+
+def completeness_mask(company):
+    """
+    Bitmask of the fields INCOMPLETE_MATCH considers missing; 0 for complete
+    or non-Active companies.
+    """
+    if company.get("status") != INCOMPLETE_MATCH["status"]:
+        return 0
+    mask = 0
+    for bit, (field, missing_value) in enumerate(COMPLETENESS_FIELDS):
+        if company.get(field) == missing_value:
+            mask |= 1 << bit
+    return mask
+
+
+def missing_fields(mask):
+    return [field for bit, (field, _) in enumerate(COMPLETENESS_FIELDS) if mask & (1 << bit)]
+
+
+def _tracker_collections():
     db = client["turf_mvp"]
-    companies_col = db["companies"]
+    return db[TRACKER_COLLECTION], db[STATE_COLLECTION]
 
+
+def _change(company, old, new_mask):
+    """
+    The update storing a company's new mask, guarded by the mask it was read
+    with, so two refreshes can't both apply the same change.
+    """
+    old_mask = old.get("mask", 0)
+    changed_at = company.get("updatedAt") or datetime.utcnow()
+    fields = {
+        "mask": new_mask,
+        "missing": missing_fields(new_mask),
+        "row": {field: company.get(field) for field in ROW_FIELDS},
+        "updatedAt": company.get("updatedAt"),
+    }
+    if new_mask and not old_mask:
+        fields["incompleteAt"] = changed_at
+    elif old_mask and not new_mask:
+        fields["fixedAt"] = changed_at
+    return UpdateOne({"_id": company["_id"], "mask": old_mask}, {"$set": fields}, upsert=True)
+
+
+def _apply_changes(tracker, changes):
+    """
+    Write a batch of mask changes in one unordered bulk write.
+
+    Returns:
+        Number of changes applied; ones lost to a concurrent refresh (the
+        guarded upsert collides on _id) are skipped
+    """
+    if not changes:
+        return 0
+    try:
+        result = tracker.bulk_write(changes, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        result = e.details
+    return result.get("nUpserted", 0) + result.get("nModified", 0)
+
+
+def _refresh_batches(tracker, state_col, batch_size):
+    state = find_one(state_col, {"_id": STATE_ID}, label="refresh_completeness") or {}
+    watermark = state.get("watermark")
+
+    # $gte: companies sharing the watermark's timestamp are re-read, which is harmless
+    match = {} if watermark is None else {"updatedAt": {"$gte": watermark}}
     pipeline = [
-        {
-            "$match": {
-                "$or": [
-                    { "estimated_num_employees": None },
-                    { "primary_industries": [] },
-                    { "annual_revenue": None },
-                    { "city": None },
-                    { "state": None },
-                    { "country": None },
-                    { "website": None },
-                    { "linkedin_url": None },
-                    
-                ],
-                "status": "Active"
-            }
-        },
-        {
-            "$facet": {
-                "statistic": [
-                    { "$count": "total" }
-                ],
-                "data": [
-                    {
-                        "$project": {
-                            "_id": 1,
-                            "name": 1,
-                            "website": { "$ifNull": ["$website", None] },
-                            "estimated_num_employees": { "$ifNull": ["$estimated_num_employees", None] },
-                            "primary_industries": { "$ifNull": ["$primary_industries", None] },
-                            "annual_revenue": { "$ifNull": ["$annual_revenue", None] },
-                            "city": { "$ifNull": ["$city", None] },
-                            "state": { "$ifNull": ["$state", None] },
-                            "country": { "$ifNull": ["$country", None] },
-                            "linkedin_url": { "$ifNull": ["$linkedin_url", None] }
-                        }
-                    }
-
-                ]
-            }
-        }
+        {"$match": match},
+        {"$sort": {"updatedAt": 1}},
+        {"$project": {**INCOMPLETE_PROJECTION, "status": 1, "updatedAt": 1}},
     ]
+    companies = iter_aggregate(
+        client["turf_mvp"]["companies"], pipeline, label="refresh_completeness",
+        allowDiskUse=True, batchSize=batch_size,
+    )
 
-    result = list(companies_col.aggregate(pipeline))
-    if result:
-        result = result[0]
-    else:
-        result = {}
+    read = applied = 0
+    while True:
+        batch = list(islice(companies, batch_size))
+        if not batch:
+            break
+        read += len(batch)
+        previous = {
+            doc["_id"]: doc
+            for doc in find(
+                tracker, {"_id": {"$in": [company["_id"] for company in batch]}}, {"mask": 1, "row": 1},
+                label="refresh_completeness",
+            )
+        }
+
+        changes = []
+        for company in batch:
+            old = previous.get(company["_id"], {})
+            new_mask = completeness_mask(company)
+            row_changed = new_mask and old.get("row") != {field: company.get(field) for field in ROW_FIELDS}
+            if new_mask != old.get("mask", 0) or row_changed:
+                changes.append(_change(company, old, new_mask))
+        applied += _apply_changes(tracker, changes)
+
+        update = {"$set": {"refreshedAt": datetime.utcnow()}}
+        batch_watermark = max((c["updatedAt"] for c in batch if c.get("updatedAt")), default=None)
+        if batch_watermark is not None:
+            update["$max"] = {"watermark": batch_watermark}
+        state_col.update_one({"_id": STATE_ID}, update, upsert=True)
+
+    return {"read": read, "applied": applied}
 
-    # Convert ObjectId to string in the "table" list
-    for doc in result.get("data", []):
-        if "_id" in doc:
-            doc["_id"] = str(doc["_id"])
 
-    return result  # returns { "statistic": [...], "table": [...] }
+def refresh_completeness(batch_size=TRACKER_BATCH_SIZE):
+    """
+    Bring the completeness tracker up to date with companies changed since the
+    last watermark. The first run (or one after rebuild_completeness) scans
+    every company; later runs only read what changed. Run from the CLI or the
+    cron warmer, not from requests.
+
+    Progress is saved after each batch, so an interrupted run resumes where it
+    stopped. Only one refresh runs at a time.
+
+    Returns:
+        Dict with the number of companies read and changes applied, or
+        {"skipped": True} if another refresh holds the lock
+    """
+    tracker, state_col = _tracker_collections()
+    with refresh_lock(state_col, STATE_ID) as held:
+        if not held:
+            return {"skipped": True}
+        return _refresh_batches(tracker, state_col, batch_size)
+
+
+def rebuild_completeness(batch_size=TRACKER_BATCH_SIZE):
+    """
+    Drop the tracker and rebuild it from every company. Needed after companies
+    are deleted, since deletions don't move the updatedAt watermark.
+    """
+    tracker, state_col = _tracker_collections()
+    with refresh_lock(state_col, STATE_ID) as held:
+        if not held:
+            return {"skipped": True}
+        tracker.drop()
+        state_col.update_one({"_id": STATE_ID}, {"$unset": {"watermark": "", "refreshedAt": ""}})
+        return _refresh_batches(tracker, state_col, batch_size)
+
+
+def get_completeness_state():
+    _, state_col = _tracker_collections()
+    return find_one(state_col, {"_id": STATE_ID}, label="get_completeness_state") or {}
+
+
+def _built_state():
+    """
+    The tracker's state document, queueing a background refresh when the
+    tracker was never built or was last refreshed too long ago.
+
+    Returns:
+        (state, refreshing): the state document, and whether a refresh is queued or running
+
+    Raises:
+        TrackerNotBuilt: No refresh has completed a batch yet
+    """
+    state = get_completeness_state()
+    refreshed_at = state.get("refreshedAt")
+    if refreshed_at is None:
+        # The first run has no watermark, so it scans every company
+        refreshers.submit(TRACKER_COLLECTION, refresh_completeness)
+        raise TrackerNotBuilt("company completeness tracker not built yet; it is being built")
+    if datetime.utcnow() - refreshed_at > timedelta(seconds=SIDE_COLLECTION_STALE_SECONDS):
+        refreshers.submit(TRACKER_COLLECTION, refresh_completeness)
+    return state, refreshers.is_pending(TRACKER_COLLECTION)
+
+
+def get_company_monitor():
+    """
+    Active companies missing at least one tracked field, read from the
+    completeness tracker as of its last refresh.
+
+    Returns:
+        {"statistic", "missing_by_field", "data"}, plus the tracker's
+        "watermark" and "refreshedAt" so clients can see how current it is
+
+    Raises:
+        TrackerNotBuilt: The tracker has never been refreshed
+    """
+    state, refreshing = _built_state()
+    tracker, _ = _tracker_collections()
+    docs = find(tracker, {"mask": {"$gt": 0}}, {"row": 1}, label="get_company_monitor")
+    data = [{"_id": str(doc["_id"]), **doc["row"]} for doc in docs]
+    counts = aggregate(tracker, [
+        {"$match": {"mask": {"$gt": 0}}},
+        {"$unwind": "$missing"},
+        {"$group": {"_id": "$missing", "count": {"$sum": 1}}},
+    ], label="get_company_monitor")
+    missing_by_field = {row["_id"]: row["count"] for row in counts}
+    return {
+        "statistic": [{"total": len(data)}],
+        "missing_by_field": {field: missing_by_field.get(field, 0) for field, _ in COMPLETENESS_FIELDS},
+        "data": data,
+        "watermark": state.get("watermark"),
+        "refreshedAt": state["refreshedAt"],
+        "refreshing": refreshing,
+    }
+
+
+def get_completeness_changes(since):
+    """
+    Companies that became incomplete, or were fixed, at or after `since`.
+
+    Args:
+        since: datetime (UTC)
+
+    Returns:
+        {"since", "watermark", "refreshedAt", "newly_incomplete": [...], "newly_fixed": [...]}
+
+    Raises:
+        TrackerNotBuilt: The tracker has never been refreshed
+    """
+    state, _ = _built_state()
+    tracker, _ = _tracker_collections()
+    newly_incomplete = find(
+        tracker, {"mask": {"$gt": 0}, "incompleteAt": {"$gte": since}},
+        {"row": 1, "missing": 1, "incompleteAt": 1}, label="get_completeness_changes",
+    )
+    newly_fixed = find(
+        tracker, {"mask": 0, "fixedAt": {"$gte": since}},
+        {"row.name": 1, "fixedAt": 1}, label="get_completeness_changes",
+    )
+    return {
+        "since": since.isoformat(),
+        "watermark": state.get("watermark"),
+        "refreshedAt": state["refreshedAt"],
+        "newly_incomplete": [
+            {"_id": str(doc["_id"]), **doc["row"], "missing": doc["missing"], "incompleteAt": doc["incompleteAt"]}
+            for doc in newly_incomplete
+        ],
+        "newly_fixed": [
+            {"_id": str(doc["_id"]), "name": doc.get("row", {}).get("name"), "fixedAt": doc["fixedAt"]}
+            for doc in newly_fixed
+        ],
+    }
+
+def iter_incomplete_companies(batch_size=5000):
+    """
+    Stream incomplete companies from the completeness tracker, one row at a
+    time, for exports that don't need the whole result in memory.
+
+    Raises:
+        TrackerNotBuilt: The tracker has never been refreshed (on the first row)
+    """
+    _built_state()
+    tracker, _ = _tracker_collections()
+    pipeline = [
+        {"$match": {"mask": {"$gt": 0}}},
+        {"$project": {"row": 1}}
+    ]
+    for doc in iter_aggregate(tracker, pipeline, label="iter_incomplete_companies", batchSize=batch_size):
+        yield {"_id": str(doc["_id"]), **doc["row"]}
 
 if __name__ == "__main__":
+    import sys
     from pprint import pprint
-    monitor = get_company_monitor()
-    pprint(monitor)
+    # From api/:
+    #   python -m services.companies_monitor --rebuild   bulk rebuild
+    #   python -m services.companies_monitor --refresh   incremental refresh (e.g. from cron)
+    if "--rebuild" in sys.argv:
+        pprint(rebuild_completeness())
+    elif "--refresh" in sys.argv:
+        pprint(refresh_completeness())
+    else:
+        monitor = get_company_monitor()
+        pprint(monitor)
@@ -0,0 +1,172 @@
+import threading
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from background import refreshers
+from config import client, COMPANY_DIRECTORY_REFRESH_SECONDS, COMPANY_DIRECTORY_TTL_SECONDS
+from instrumentation import find, iter_aggregate
+
+COMPANY_PROJECTION = {"_id": 1, "name": 1, "status": 1, "updatedAt": 1}
+
+
+class CompanyDirectory:
+    """
+    Process-wide company_id -> (name, status) map, used instead of joining
+    companies on the server.
+
+    The whole map is loaded once and reloaded every ttl seconds (which also
+    drops deleted companies). In between, at most every refresh_interval
+    seconds, companies changed since the updatedAt watermark are re-read.
+
+    Loads and refreshes run in the background (or from the cron warmer), never
+    in a request: requests read the previous snapshot meanwhile. Until the
+    first load finishes, a request looks up just the companies it needs.
+    """
+
+    def __init__(self, mongo_client=None, ttl=COMPANY_DIRECTORY_TTL_SECONDS,
+                 refresh_interval=COMPANY_DIRECTORY_REFRESH_SECONDS):
+        self.client = mongo_client
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._watermark = None
+        self._loaded_at = None
+        self._checked_at = None
+        # Bumped by reset, so a load started before it doesn't install its result
+        self._generation = 0
+
+    def _collection(self):
+        return (self.client or client)["turf_mvp"]["companies"]
+
+    def _advance(self, company):
+        updated_at = company.get("updatedAt")
+        if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    def load(self):
+        """
+        Replace the whole map with a fresh bulk read of every company.
+        """
+        generation = self._generation
+        entries = {}
+        watermark = None
+        pipeline = [{"$project": COMPANY_PROJECTION}]
+        for company in iter_aggregate(self._collection(), pipeline, label="company_directory_load", batchSize=10000):
+            entries[company["_id"]] = (company.get("name"), company.get("status"))
+            updated_at = company.get("updatedAt")
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        if generation != self._generation:
+            return
+        self._entries, self._watermark = entries, watermark
+        self._loaded_at = self._checked_at = time.monotonic()
+
+    def refresh_changed(self):
+        """
+        Re-read companies changed since the watermark.
+        """
+        query = {} if self._watermark is None else {"updatedAt": {"$gte": self._watermark}}
+        for company in find(self._collection(), query, COMPANY_PROJECTION, label="company_directory_refresh"):
+            self._entries[company["_id"]] = (company.get("name"), company.get("status"))
+            self._advance(company)
+        self._checked_at = time.monotonic()
+
+    def update(self):
+        """
+        Reload or refresh the map if either is due. Runs in the background or
+        from the cron warmer.
+
+        Returns:
+            Number of companies in the map
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+                self.load()
+            elif now - self._checked_at >= self.refresh_interval:
+                self.refresh_changed()
+        return len(self._entries)
+
+    def _lookup(self, company_ids):
+        """
+        Read the given companies that aren't in the map yet with one keyed query.
+        """
+        object_ids = set()
+        for company_id in company_ids:
+            try:
+                object_ids.add(company_id if isinstance(company_id, ObjectId) else ObjectId(company_id))
+            except (InvalidId, TypeError):
+                continue
+        missing = [company_id for company_id in object_ids if company_id not in self._entries]
+        if not missing:
+            return
+        companies = find(
+            self._collection(), {"_id": {"$in": missing}}, {"name": 1, "status": 1}, label="company_directory_lookup",
+        )
+        self._entries.update((company["_id"], (company.get("name"), company.get("status"))) for company in companies)
+
+    def ensure_fresh(self, company_ids=()):
+        """
+        Queue a background reload or refresh if one is due. Before the first
+        load has finished, look up company_ids directly so the caller still
+        gets their names.
+        """
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            refreshers.submit(f"company_directory:{id(self)}", self.update)
+        if self._loaded_at is None and company_ids:
+            self._lookup(company_ids)
+        return self
+
+    def get(self, company_id):
+        """
+        Return (name, status) for a company id (ObjectId or hex string), or None if unknown.
+        """
+        if not isinstance(company_id, ObjectId):
+            try:
+                company_id = ObjectId(company_id)
+            except (InvalidId, TypeError):
+                return None
+        return self._entries.get(company_id)
+
+    def name(self, company_id, default=""):
+        entry = self.get(company_id)
+        if entry is None or entry[0] is None:
+            return default
+        return entry[0]
+
+    def reset(self):
+        self._generation += 1
+        self._entries = {}
+        self._watermark = self._loaded_at = self._checked_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_directory = CompanyDirectory()
+
+
+def get_company_directory(company_ids=()):
+    """
+    The shared directory. A due reload or refresh is queued in the background;
+    company_ids are the companies the caller is about to look up.
+    """
+    return _directory.ensure_fresh(company_ids)
+
+
+def refresh_company_directory():
+    """
+    Reload or refresh the shared directory now if it is due, e.g. from the cron warmer.
+    """
+    return {"companies": _directory.update()}
+
+
+def reset_company_directory():
+    """
+    Forget everything loaded so far, e.g. after pointing the services at another database.
+    """
+    _directory.reset()
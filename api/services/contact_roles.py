@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReplaceOne
+
+from background import refreshers
+from config import SIDE_COLLECTION_STALE_SECONDS, client
+from instrumentation import find, find_one, iter_aggregate
+from refresh_lock import refresh_lock
+
+# Side collection: one document per contact with its experience titles
+# (normalized) and their order_in_profile, plus an updatedAt watermark
+ROLES_COLLECTION = "contact_roles"
+STATE_COLLECTION = "contact_roles_state"
+STATE_ID = "contacts"
+ROLES_BATCH_SIZE = 1000
+
+CONTACT_PROJECTION = {
+    "updatedAt": 1,
+    "coresignal_data.experience.position_title": 1,
+    "coresignal_data.experience.order_in_profile": 1,
+}
+
+
+def normalize_title(title):
+    """
+    Key used to match a vt_contact's current_role to an experience title:
+    case-insensitive, with runs of whitespace collapsed.
+    """
+    if title is None:
+        return None
+    return " ".join(str(title).split()).casefold()
+
+
+def contact_roles_doc(contact):
+    """
+    Build a contact_roles document from a contact. "roles" is a list of
+    [normalized title, order_in_profile] pairs, first occurrence of a title
+    only, or None when the contact has no experience data.
+    """
+    experiences = (contact.get("coresignal_data") or {}).get("experience")
+    roles = None
+    if isinstance(experiences, list):
+        roles, seen = [], set()
+        for exp in experiences:
+            title = normalize_title(exp.get("position_title"))
+            if title is None or title in seen:
+                continue
+            seen.add(title)
+            roles.append([title, exp.get("order_in_profile", 1)])
+    return {"_id": contact["_id"], "roles": roles, "updatedAt": contact.get("updatedAt")}
+
+
+def _collections():
+    db = client["turf_mvp"]
+    return db[ROLES_COLLECTION], db[STATE_COLLECTION]
+
+
+def _refresh_batches(roles_col, state_col, batch_size):
+    state = find_one(state_col, {"_id": STATE_ID}, label="refresh_contact_roles") or {}
+    watermark = state.get("watermark")
+
+    # $gte: contacts sharing the watermark's timestamp are re-read, which is harmless
+    match = {} if watermark is None else {"updatedAt": {"$gte": watermark}}
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"updatedAt": 1}},
+        {"$project": CONTACT_PROJECTION},
+    ]
+    contacts = iter_aggregate(
+        client["turf_mvp"]["contacts"], pipeline, label="refresh_contact_roles",
+        allowDiskUse=True, batchSize=batch_size,
+    )
+
+    read = 0
+    while True:
+        batch = list(islice(contacts, batch_size))
+        if not batch:
+            break
+        read += len(batch)
+        roles_col.bulk_write(
+            [ReplaceOne({"_id": c["_id"]}, contact_roles_doc(c), upsert=True) for c in batch], ordered=False,
+        )
+        update = {"$set": {"refreshedAt": datetime.utcnow()}}
+        batch_watermark = max((c["updatedAt"] for c in batch if c.get("updatedAt")), default=None)
+        if batch_watermark is not None:
+            update["$max"] = {"watermark": batch_watermark}
+        state_col.update_one({"_id": STATE_ID}, update, upsert=True)
+
+    return {"read": read}
+
+
+def refresh_contact_roles(batch_size=ROLES_BATCH_SIZE):
+    """
+    Rebuild the roles of contacts changed since the last watermark. The first
+    run (or one after rebuild_contact_roles) reads every contact. Progress is
+    saved after each batch. Run from the CLI, the cron warmer or in the
+    background when a read finds it stale; only one refresh runs at a time.
+
+    Returns:
+        Dict with the number of contacts read, or {"skipped": True} if another
+        refresh holds the lock
+    """
+    roles_col, state_col = _collections()
+    with refresh_lock(state_col, STATE_ID) as held:
+        if not held:
+            return {"skipped": True}
+        return _refresh_batches(roles_col, state_col, batch_size)
+
+
+def rebuild_contact_roles(batch_size=ROLES_BATCH_SIZE):
+    """
+    Drop the side collection and rebuild it from every contact. Needed after
+    contacts are deleted, since deletions don't move the updatedAt watermark.
+    """
+    roles_col, state_col = _collections()
+    with refresh_lock(state_col, STATE_ID) as held:
+        if not held:
+            return {"skipped": True}
+        roles_col.drop()
+        state_col.update_one({"_id": STATE_ID}, {"$unset": {"watermark": ""}})
+        return _refresh_batches(roles_col, state_col, batch_size)
+
+
+def _store_roles(docs):
+    roles_col, _ = _collections()
+    roles_col.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+
+def _refresh_if_stale():
+    """
+    Queue a background refresh_contact_roles when the side collection was never
+    refreshed or was last refreshed more than SIDE_COLLECTION_STALE_SECONDS ago.
+    """
+    _, state_col = _collections()
+    state = find_one(state_col, {"_id": STATE_ID}, {"refreshedAt": 1}, label="resolve_contact_roles") or {}
+    refreshed_at = state.get("refreshedAt")
+    if refreshed_at is None or datetime.utcnow() - refreshed_at > timedelta(seconds=SIDE_COLLECTION_STALE_SECONDS):
+        refreshers.submit(ROLES_COLLECTION, refresh_contact_roles)
+
+
+def resolve_contact_roles(contact_ids):
+    """
+    Look up the roles of many contacts with one keyed query. Contacts missing
+    from the side collection are read from contacts with one $in query. The
+    request only reads: the missing documents are written, and a stale side
+    collection refreshed, in the background.
+
+    Args:
+        contact_ids: Iterable of contact ids (ObjectId or hex string); invalid ones are ignored
+
+    Returns:
+        Dict of str(contact_id) -> {normalized title: order_in_profile}. Contacts that
+        don't exist or have no experience data are left out.
+    """
+    object_ids = set()
+    for contact_id in contact_ids:
+        try:
+            object_ids.add(ObjectId(contact_id))
+        except (InvalidId, TypeError):
+            continue
+    if not object_ids:
+        return {}
+
+    _refresh_if_stale()
+    roles_col, _ = _collections()
+    docs = find(roles_col, {"_id": {"$in": list(object_ids)}}, label="resolve_contact_roles")
+
+    missing = object_ids - {doc["_id"] for doc in docs}
+    if missing:
+        contacts = find(
+            client["turf_mvp"]["contacts"], {"_id": {"$in": list(missing)}}, CONTACT_PROJECTION,
+            label="resolve_contact_roles",
+        )
+        fetched = [contact_roles_doc(contact) for contact in contacts]
+        if fetched:
+            refreshers.submit(f"{ROLES_COLLECTION}:{min(doc['_id'] for doc in fetched)}:{len(fetched)}",
+                              _store_roles, fetched)
+        docs.extend(fetched)
+
+    return {str(doc["_id"]): dict(doc["roles"]) for doc in docs if doc.get("roles") is not None}
+
+
+if __name__ == "__main__":
+    # From api/:
+    #   python -m services.contact_roles --rebuild   bulk rebuild
+    #   python -m services.contact_roles             incremental refresh (e.g. from cron)
+    import sys
+    from pprint import pprint
+    if "--rebuild" in sys.argv:
+        pprint(rebuild_contact_roles())
+    else:
+        pprint(refresh_contact_roles())
@@ -1,42 +1,19 @@
-from pymongo import MongoClient
-from datetime import datetime, timedelta
+import logging
+
+from pymongo.errors import ExecutionTimeout
+from datetime import datetime, timedelta, timezone
 from config import client  # your existing client
+from instrumentation import aggregate
+from services.company_directory import get_company_directory
+from services.contact_roles import normalize_title, resolve_contact_roles
+from cache import cached
+from timezones import DEFAULT_TZ, day_key, resolve_tz, window_start, with_timezone
 from bson import ObjectId
 from bson.son import SON
 from collections import defaultdict
-def fill_missing_dates(data, view_range=30):
-    """
-    Fill missing dates in the data with 0 values.
-    
-    Args:
-        data: List of dictionaries with "_id" (date) and "count" keys
-        view_range: Number of days to look back
-    
-    Returns:
-        List with all dates in the range, missing dates filled with count=0
-    """
-    # Generate all dates in the range
-    today = datetime.utcnow()
-    start_date = today - timedelta(days=view_range)
-    
-    all_dates = []
-    current_date = start_date
-    while current_date <= today:
-        all_dates.append(current_date.strftime("%Y-%m-%d"))
-        current_date += timedelta(days=1)
-    
-    # Convert data to dict for easy lookup
-    data_dict = {item["_id"]: item["count"] for item in data}
-    
-    # Fill missing dates with 0
-    filled_data = []
-    for date in all_dates:
-        filled_data.append({
-            "_id": date,
-            "count": data_dict.get(date, 0)
-        })
-    
-    return filled_data
+
+logger = logging.getLogger("turf_monitor.contacts")
+
 
 def convert_object_ids(obj):
     if isinstance(obj, list):
@@ -51,13 +28,12 @@ def convert_object_ids(obj):
     else:
         return obj
     
-def count_vt_contacts_exp(view_range: int = 30):
+def count_vt_contacts_exp(view_range: int = 30, tz=DEFAULT_TZ):
     db = client["turf_mvp"]
     vt_collection = db["companyvaluetriggers"]
-    contacts_collection = db["contacts"]
 
-    today = datetime.utcnow()
-    start_date = today - timedelta(days=view_range)
+    zone = resolve_tz(tz)
+    start_date = window_start(view_range, tz)
 
     pipeline = [
         {
@@ -74,7 +50,11 @@ def count_vt_contacts_exp(view_range: int = 30):
         }
     ]
 
-    vt_results = list(vt_collection.aggregate(pipeline))
+    vt_results = aggregate(vt_collection, pipeline, label="count_vt_contacts_exp")
+
+    roles = resolve_contact_roles(
+        vt_contact.get("contact_id") for doc in vt_results for vt_contact in doc["vt_contacts"]
+    )
 
     counts_by_day = defaultdict(int)
 
@@ -83,43 +63,31 @@ def count_vt_contacts_exp(view_range: int = 30):
         if not created_at:
             continue
 
-        date_str = created_at.strftime("%Y-%m-%d")
+        # createdAt is stored as naive UTC; bucket by the day in tz
+        date_str = created_at.replace(tzinfo=timezone.utc).astimezone(zone).strftime("%Y-%m-%d")
 
         for vt_contact in doc["vt_contacts"]:
-            try:
-                # safely extract fields
-                contact_id = vt_contact["contact_id"] if "contact_id" in vt_contact else None
-                current_role = vt_contact.get("current_role")
-                email = vt_contact.get("email")
-
-                if not contact_id or not current_role or not email:
-                    continue
+            contact_id = vt_contact.get("contact_id")
+            current_role = vt_contact.get("current_role")
+            email = vt_contact.get("email")
 
-                # contact_id is ObjectId — do not call .get on it
-                contact_doc = contacts_collection.find_one({"_id": ObjectId(contact_id)})
-                if not contact_doc:
-                    continue
-
-                experiences = contact_doc.get("coresignal_data", {}).get("experience", [])
-                for exp in experiences:
-                    if exp.get("position_title") == current_role:
-                        if exp.get("order_in_profile", 1) > 1:
-                            counts_by_day[date_str] += 1
-                        break
-
-            except Exception as e:
-                print(f"Error processing contact: {e}")
+            if not contact_id or not current_role or not email:
                 continue
 
+            # Contacts that don't exist or have no experience data aren't counted
+            order = roles.get(str(contact_id), {}).get(normalize_title(current_role))
+            if order is not None and order > 1:
+                counts_by_day[date_str] += 1
+
     return [{"_id": date, "count": count} for date, count in sorted(counts_by_day.items())]
-def count_contacts_data_by_day(view_range=30):
+@cached(vary=day_key)
+def count_contacts_data_by_day(view_range=30, tz=DEFAULT_TZ):
     try:
         db = client["turf_mvp"]
         collection = db["contacts"]
 
-        # Date range
-        today = datetime.utcnow()
-        start_date = today - timedelta(days=view_range)
+        # Date range, counted back from now in tz
+        start_date = window_start(view_range, tz)
 
 
         pipeline = [
@@ -138,43 +106,31 @@ def count_contacts_data_by_day(view_range=30):
             }},
             {"$group": {
                 "_id": {
-                    "$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}
+                    "$dateToString": with_timezone({"format": "%Y-%m-%d", "date": "$createdAt"}, tz)
                 },
                 "count": {"$sum": 1}
             }},
             {"$sort": SON([("_id", 1)])}
         ]
 
-        results = list(collection.aggregate(pipeline))
-        
-        # Fill missing dates with 0
-        results = fill_missing_dates(results, view_range)
-        
+        results = aggregate(collection, pipeline, label="count_contacts_data_by_day")
+
+        # Days without documents are left out; timeseries.TimeSeries fills them with 0
         return results
 
+    except ExecutionTimeout:
+        raise
     except Exception as e:
         raise Exception(f'error count_data_by_day: {e}')
 def aggregate_contacts_stats(period:str):
     db = client["turf_mvp"]
     vt_collection = db["companyvaluetriggers"]
-    contacts_collection = db["contacts"]
     today = datetime.utcnow()
     start_date = today - timedelta(days=period)
 
     pipeline = [
         # 1. Only documents with non-empty vt_contacts
         {"$match": {"vt_contacts": {"$exists": True, "$ne": []}, "createdAt": {"$gte": start_date}}},
-        # 3. Lookup company name
-        {
-            "$lookup": {
-                "from": "companies",
-                "localField": "company_id",
-                "foreignField": "_id",
-                "as": "company"
-            }
-        },
-        {"$unwind": "$company"},
-
         # 4. Sort by createdAt descending (newest first)
         {"$sort": {"createdAt": -1}},
 
@@ -185,7 +141,6 @@ def aggregate_contacts_stats(period:str):
             "$project": {
                 "_id": 1,
                 "company_id": 1,
-                "company_name": "$company.name",
                 "vt_title": 1,
                 "vt_contacts": 1,
             }
@@ -193,17 +148,26 @@ def aggregate_contacts_stats(period:str):
     ]
 
 
-    vt_results = list(vt_collection.aggregate(pipeline))
+    vt_results = aggregate(vt_collection, pipeline, label="aggregate_contacts_stats")
+
+    roles = resolve_contact_roles(
+        vt_contact.get("contact_id") for doc in vt_results for vt_contact in doc["vt_contacts"]
+    )
+    directory = get_company_directory(doc.get("company_id") for doc in vt_results)
     final_results = []
 
     for doc in vt_results:
-        
+        # Value triggers whose company doesn't exist are skipped
+        company = directory.get(doc.get("company_id"))
+        if company is None:
+            continue
+
         for vt_contact in doc["vt_contacts"]:
             try:
                 temp_results = {
                     "vt_id": doc["_id"],
                     "company_id": doc["company_id"],
-                    "company_name": doc["company_name"],
+                    "company_name": company[0],
                     "vt_title": doc["vt_title"],
                     "contact_name": vt_contact["name"],
                     "contact_email": vt_contact["email"],
@@ -211,19 +175,17 @@ def aggregate_contacts_stats(period:str):
                     "contact_id": vt_contact["contact_id"],
                    
                 }
-                contact_data = contacts_collection.find_one(
-                    {"_id": ObjectId(vt_contact["contact_id"])}
-                )
+                # Skip contacts that don't exist or have no experience data
+                contact_roles = roles.get(str(vt_contact["contact_id"]))
+                if contact_roles is None:
+                    continue
                 temp_results["contact_role"] = vt_contact["current_role"] or ''
-                # iterate contact_data experience and get the order_in_profile
-                temp_results["experience_order"] = 1
-                for experience in contact_data["coresignal_data"]["experience"]:
-                    if experience["position_title"] == vt_contact["current_role"]:
-                        temp_results["experience_order"] = experience["order_in_profile"]
-                        break
+                # order_in_profile of the experience matching the current role, 1 if none matches
+                temp_results["experience_order"] = contact_roles.get(normalize_title(vt_contact["current_role"]), 1)
                 final_results.append(temp_results)
             except Exception as e:
-                print(e)
+                # A vt_contact missing one of the fields above; the rest of the trigger is still exported
+                logger.warning(f"skipping vt_contact {vt_contact.get('contact_id')} of value trigger {doc['_id']}: {e!r}")
                 continue
     final_results = [convert_object_ids(result) for result in final_results]
     final_results.sort(key=lambda x: x["contact_id"])  # Sort by contact_id
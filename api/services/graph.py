@@ -1,43 +1,14 @@
-from flask import jsonify
-from datetime import datetime, timedelta
 from bson.son import SON
-from config import client
+from pymongo.errors import ExecutionTimeout
+from config import client, APPROX_SAMPLE_SIZE
+from instrumentation import aggregate, estimated_document_count
+from coalesce import make_key
+from cache import cached
+from approx import refiner, scale_sample
+from timezones import DEFAULT_TZ, day_key, window_start, with_timezone
 
-def fill_missing_dates(data, view_range=30):
-    """
-    Fill missing dates in the data with 0 values.
-    
-    Args:
-        data: List of dictionaries with "_id" (date) and "count" keys
-        view_range: Number of days to look back
-    
-    Returns:
-        List with all dates in the range, missing dates filled with count=0
-    """
-    # Generate all dates in the range
-    today = datetime.utcnow()
-    start_date = today - timedelta(days=view_range)
-    
-    all_dates = []
-    current_date = start_date
-    while current_date <= today:
-        all_dates.append(current_date.strftime("%Y-%m-%d"))
-        current_date += timedelta(days=1)
-    
-    # Convert data to dict for easy lookup
-    data_dict = {item["_id"]: item["count"] for item in data}
-    
-    # Fill missing dates with 0
-    filled_data = []
-    for date in all_dates:
-        filled_data.append({
-            "_id": date,
-            "count": data_dict.get(date, 0)
-        })
-    
-    return filled_data
-
-def count_data_by_day(db_name, col_name, view_range=30, match_query={}):
+@cached(vary=day_key)
+def count_data_by_day(db_name, col_name, view_range=30, match_query=None, tz=DEFAULT_TZ):
     try:
         # Validate
         if not db_name or not col_name:
@@ -46,33 +17,106 @@ def count_data_by_day(db_name, col_name, view_range=30, match_query={}):
         # Get collection
         db = client[db_name]
         collection = db[col_name]
-        # Date range
-        today = datetime.utcnow()
-        start_date = today - timedelta(days=view_range)
+        # Date range, counted back from now in tz
+        start_date = window_start(view_range, tz)
 
-        # Build match query
-        match_query["createdAt"] = {"$gte": start_date}
+        # Build match query on a copy; the caller's filter is part of the cache key
+        match_query = {**(match_query or {}), "createdAt": {"$gte": start_date}}
 
         # MongoDB aggregation pipeline
         pipeline = [
             {"$match": match_query},
             {"$group": {
                 "_id": {
-                    "$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}
+                    "$dateToString": with_timezone({"format": "%Y-%m-%d", "date": "$createdAt"}, tz)
                 },
                 "count": {"$sum": 1}
             }},
             {"$sort": SON([("_id", 1)])}
         ]
-        print(pipeline)
-
-        results = list(collection.aggregate(pipeline))
-        
-        # Fill missing dates with 0
-        results = fill_missing_dates(results, view_range)
+        results = aggregate(collection, pipeline, label="count_data_by_day")
 
+        # Days without documents are left out; timeseries.TimeSeries fills them with 0
         return results
 
+    except ExecutionTimeout:
+        raise
     except Exception as e:
         raise Exception(f'error count_data_by_day: {e}')
-    
+
+
+def estimate_data_by_day(db_name, col_name, view_range=30, match_query=None, tz=DEFAULT_TZ,
+                         sample_size=APPROX_SAMPLE_SIZE, population=None):
+    """
+    Estimate count_data_by_day from a random sample of the collection.
+
+    Args:
+        db_name: Database name
+        col_name: Collection name
+        view_range: Days to count back from today
+        match_query: Filter on top of the createdAt window
+        tz: IANA timezone the days are bucketed in
+        sample_size: Documents to sample
+        population: Documents in the collection, if already known
+
+    Returns:
+        approx.Estimate (rows plus error bound)
+    """
+    collection = client[db_name][col_name]
+    if population is None:
+        population = estimated_document_count(collection, label="count_data_by_day_approx")
+
+    # $sample first so MongoDB can pick random documents without a scan,
+    # then the window and filter are applied to the sample
+    pipeline = [
+        {"$sample": {"size": sample_size}},
+        {"$match": {**(match_query or {}), "createdAt": {"$gte": window_start(view_range, tz)}}},
+        {"$group": {
+            "_id": {
+                "$dateToString": with_timezone({"format": "%Y-%m-%d", "date": "$createdAt"}, tz)
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$sort": SON([("_id", 1)])}
+    ]
+    rows = aggregate(collection, pipeline, label="count_data_by_day_approx")
+    return scale_sample(rows, sample_size, population)
+
+
+def count_data_by_day_approx(db_name, col_name, view_range=30, match_query=None, tz=DEFAULT_TZ,
+                             sample_size=APPROX_SAMPLE_SIZE):
+    """
+    count_data_by_day, estimated when the exact result isn't at hand.
+
+    If the exact result is already cached it is returned as is. Otherwise an
+    estimate_data_by_day estimate is returned and the exact result is computed
+    in the background and cached, so the next request gets it.
+
+    Returns:
+        Exact rows, or an approx.Estimate (rows plus error bound)
+    """
+    try:
+        args = (db_name, col_name, view_range, dict(match_query or {}), tz)
+        exact = count_data_by_day.peek(*args)
+        if exact is not None:
+            return exact
+
+        population = estimated_document_count(client[db_name][col_name], label="count_data_by_day_approx")
+        if population <= sample_size:
+            # Sampling would read the whole collection anyway
+            return count_data_by_day(*args)
+
+        refiner.submit(make_key(count_data_by_day, args, {}), count_data_by_day, *args)
+        return estimate_data_by_day(*args, sample_size=sample_size, population=population)
+
+    except ExecutionTimeout:
+        raise
+    except Exception as e:
+        raise Exception(f'error count_data_by_day_approx: {e}')
+
+
+def day_counter(approx=False):
+    """
+    The per-day count function a graph should use.
+    """
+    return count_data_by_day_approx if approx else count_data_by_day
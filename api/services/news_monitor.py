@@ -1,13 +1,19 @@
-from pymongo import MongoClient
 from datetime import datetime, timedelta
 from config import client  # assume this is your client instance
+from instrumentation import aggregate
+from cache import cached
+from services.company_directory import get_company_directory
+from timezones import DEFAULT_TZ, day_key, window_start, with_timezone
 
+@cached(vary=day_key)
 def aggregate_total_news_daily(page=1, page_size=10):
     db = client["turf_mvp"]
     companies_col = db["companies"]
     
-    # Get today's date string for comparison
-    today_str = datetime.utcnow().strftime("%Y-%m-%d")
+    # Today's UTC day as a range so the status lookup can use its index
+    today = datetime.utcnow()
+    today_start = datetime(today.year, today.month, today.day)
+    tomorrow_start = today_start + timedelta(days=1)
     
     # Calculate skip value for pagination
     skip = (page - 1) * page_size
@@ -24,20 +30,9 @@ def aggregate_total_news_daily(page=1, page_size=10):
                 "pipeline": [
                     {
                         "$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$eq": ["$type", "news_count"]},
-                                    {"$eq": ["$name", "$$companyIdStr"]},
-                                    {
-                                        "$eq": [
-                                            {
-                                                "$dateToString": {"format": "%Y-%m-%d", "date": "$createdAt"}
-                                            },
-                                            today_str
-                                        ]
-                                    }
-                                ]
-                            }
+                            "type": "news_count",
+                            "createdAt": {"$gte": today_start, "$lt": tomorrow_start},
+                            "$expr": {"$eq": ["$name", "$$companyIdStr"]}
                         }
                     },
                     {
@@ -75,10 +70,10 @@ def aggregate_total_news_daily(page=1, page_size=10):
     
     # Get total count for pagination info
     count_pipeline = [{"$match": {"status": "Active"}}, {"$count": "total"}]
-    count_result = list(companies_col.aggregate(count_pipeline))
+    count_result = aggregate(companies_col, count_pipeline, label="aggregate_total_news_daily")
     total_count = count_result[0]["total"] if count_result else 0
     
-    results = list(companies_col.aggregate(pipeline))
+    results = aggregate(companies_col, pipeline, label="aggregate_total_news_daily")
     
     # Convert ObjectId to string for JSON serialization
     for item in results:
@@ -100,12 +95,12 @@ def aggregate_total_news_daily(page=1, page_size=10):
         }
     }
 
-def aggregate_bad_news_model_stats(view_range=30):
+@cached(vary=day_key)
+def aggregate_bad_news_model_stats(view_range=30, tz=DEFAULT_TZ):
     db = client["turf_mvp"]
     companies_col = db["companies"]
 
-    today = datetime.utcnow()
-    start_date = today - timedelta(days=view_range)
+    start_date = window_start(view_range, tz)
 
     pipeline = [
         {"$match": {
@@ -130,18 +125,16 @@ def aggregate_bad_news_model_stats(view_range=30):
         {"$unwind": "$logs"},
         {"$project": {
             "company_id": "$_id",
-            "name": 1,
             "createdAt": "$logs.createdAt",
             "openai_model": "$logs.openai_model"
         }},
         {"$addFields": {
-            "date_str": {"$dateToString": {"format": "%d/%m/%Y", "date": "$createdAt"}},
-            "date_obj": {"$dateTrunc": {"date": "$createdAt", "unit": "day"}}  # for sorting
+            "date_str": {"$dateToString": with_timezone({"format": "%d/%m/%Y", "date": "$createdAt"}, tz)},
+            "date_obj": {"$dateTrunc": with_timezone({"date": "$createdAt", "unit": "day"}, tz)}  # for sorting
         }},
         {"$group": {
             "_id": {
                 "company_id": "$company_id",
-                "name": "$name",
                 "date_str": "$date_str",
                 "date_obj": "$date_obj",
                 "model": "$openai_model"
@@ -151,7 +144,6 @@ def aggregate_bad_news_model_stats(view_range=30):
         {"$group": {
             "_id": {
                 "company_id": "$_id.company_id",
-                "name": "$_id.name",
                 "date_str": "$_id.date_str",
                 "date_obj": "$_id.date_obj"
             },
@@ -165,7 +157,6 @@ def aggregate_bad_news_model_stats(view_range=30):
         {"$project": {
             "_id": 0,
             "company_id": "$_id.company_id",
-            "name": "$_id.name",
             "date": "$_id.date_str",
             "date_obj": "$_id.date_obj",
             "gpt_4_1": {
@@ -186,7 +177,8 @@ def aggregate_bad_news_model_stats(view_range=30):
         {"$sort": {"date_obj": -1}}  # ✅ Final sort by actual date
     ]
 
-    results = list(companies_col.aggregate(pipeline))
+    results = aggregate(companies_col, pipeline, label="aggregate_bad_news_model_stats")
+    directory = get_company_directory(item["company_id"] for item in results)
 
     # Flatten counts and collect for stats
     gpt_4_1_counts = []
@@ -197,6 +189,8 @@ def aggregate_bad_news_model_stats(view_range=30):
         del item["gpt_4_1"]
         del item["gpt_4o_mini"]
         del item["date_obj"]  # optional: remove raw date
+        # Names come from the company directory instead of being carried through the $group stages
+        item["name"] = directory.name(item["company_id"], default=None)
         # Convert ObjectId to string for JSON serialization
         if "company_id" in item:
             item["company_id"] = str(item["company_id"])
@@ -1,6 +1,8 @@
-from pymongo import MongoClient
 from datetime import datetime, timedelta
 from config import client 
+from instrumentation import find, find_one
+from budget import TIMEOUT_ERRORS
+from services.company_directory import get_company_directory
 from bson import ObjectId
 from dateutil import parser as date_parser  # Add this import at the top
 
@@ -42,28 +44,25 @@ def get_edgar_data_by_date(input_date_str):
         # Get collections
         turf_mvp_col = client["turf_mvp"]["datasources"]
         edgar_col = client["turf_prototype"]["edgar_file"]
-        company_col = client["turf_mvp"]["companies"]
 
         # Fetch data
-        sources = list(turf_mvp_col.find(
+        sources = find(
+            turf_mvp_col,
             source_match_query,
-            {"_id": 1, "company_id": 1, "date": 1, "raw_source_id": 1, "url": 1}
-        ))
+            {"_id": 1, "company_id": 1, "date": 1, "raw_source_id": 1, "url": 1},
+            label="get_edgar_data_by_date"
+        )
 
-        edgar_files = list(edgar_col.find(
+        edgar_files = find(
+            edgar_col,
             file_match_query,
-            {"_id": 1, "company_id": 1, "file_date": 1, "file_url": 1}
-        ))
+            {"_id": 1, "company_id": 1, "file_date": 1, "file_url": 1},
+            label="get_edgar_data_by_date"
+        )
 
-        # Collect unique company_ids
-        company_ids = {s["company_id"] for s in sources if s.get("company_id")}
-        company_ids.update(f["company_id"] for f in edgar_files if f.get("company_id"))
-
-        companies = list(company_col.find(
-            {"_id": {"$in": list(company_ids)}},
-            {"_id": 1, "name": 1}
-        ))
-        company_map = {str(c["_id"]): c.get("name", "") for c in companies}
+        directory = get_company_directory(
+            [src.get("company_id") for src in sources] + [file.get("company_id") for file in edgar_files]
+        )
 
         merged = []
 
@@ -72,7 +71,7 @@ def get_edgar_data_by_date(input_date_str):
             datasource_id = str(src["_id"])
             company_id = src.get("company_id")
             company_id_str = str(company_id) if company_id else ""
-            company_name = company_map.get(company_id_str, "")
+            company_name = directory.name(company_id) if company_id else ""
             raw_source_id = str(src.get("raw_source_id")) if src.get("raw_source_id") else ""
             date=normalize_date(src.get("date"))
 
@@ -91,15 +90,17 @@ def get_edgar_data_by_date(input_date_str):
             file_id_str = str(file_id)
 
             # Lookup datasource (can be old) matching raw_source_id == file._id
-            matched_ds = turf_mvp_col.find_one(
+            matched_ds = find_one(
+                turf_mvp_col,
                 {"raw_source_id": file_id},
-                {"_id": 1}
+                {"_id": 1},
+                label="get_edgar_data_by_date"
             )
             datasource_id = str(matched_ds["_id"]) if matched_ds else ""
 
             company_id = file.get("company_id")
             company_id_str = str(company_id) if company_id else ""
-            company_name = company_map.get(company_id_str, "")
+            company_name = directory.name(company_id) if company_id else ""
 
             merged.append({
                 "datasource_id": datasource_id,
@@ -112,6 +113,8 @@ def get_edgar_data_by_date(input_date_str):
 
         return merged
 
+    except TIMEOUT_ERRORS:
+        raise
     except Exception as e:
         return {"error": f"Error in get_edgar_data_by_date: {e}"}
    
\ No newline at end of file
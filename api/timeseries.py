@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+import numpy as np
+
+from timezones import DEFAULT_TZ, local_now
+
+# Response shapes a graph can be serialized to
+SHAPES = ("rows", "columnar")
+
+
+def period_dates(period, now=None, tz=DEFAULT_TZ):
+    """
+    Every day from `period` days ago through today in tz, as "YYYY-MM-DD".
+    """
+    today = now or local_now(tz)
+    start = today - timedelta(days=period)
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(period + 1)] if period >= 0 else []
+
+
+class TimeSeries:
+    """
+    Daily metrics on a shared date index, one NumPy column per metric.
+
+    Count columns are filled from service rows ({"_id": date, "count": n});
+    days without a row are 0. Ratio columns are computed from other columns
+    in one vectorized step.
+    """
+
+    def __init__(self, dates):
+        self.dates = list(dates)
+        self._positions = {date: i for i, date in enumerate(self.dates)}
+        self.columns = {}
+
+    @classmethod
+    def for_period(cls, period, now=None, tz=DEFAULT_TZ):
+        return cls(period_dates(period, now, tz))
+
+    @classmethod
+    def from_counts(cls, metrics_list, period, now=None, tz=DEFAULT_TZ):
+        """
+        Build a series with one count column per metric, named metrics1..metricsN.
+        """
+        series = cls.for_period(period, now, tz)
+        for i, rows in enumerate(metrics_list):
+            series.add_counts(f"metrics{i + 1}", rows)
+        return series
+
+    def __len__(self):
+        return len(self.dates)
+
+    def add_counts(self, name, rows):
+        """
+        Add a count column from rows with "_id" (date) and "count"; rows outside the index are ignored.
+        """
+        column = np.zeros(len(self.dates), dtype=np.int64)
+        for row in rows:
+            position = self._positions.get(row["_id"])
+            if position is not None:
+                column[position] = row["count"]
+        self.columns[name] = column
+        return self
+
+    def add_ratio(self, name, numerator, denominator, scale=100, decimals=2):
+        """
+        Add round(numerator / denominator * scale, decimals), or 0 where the denominator is 0.
+        """
+        num = self.columns[numerator].astype(np.float64)
+        den = self.columns[denominator].astype(np.float64)
+        ratio = np.divide(num, den, out=np.zeros(len(self.dates)), where=den != 0)
+        self.columns[name] = np.round(ratio * scale, decimals)
+        return self
+
+    def total(self, name):
+        return self.columns[name].sum().item()
+
+    def statistics(self, names, stats=("total", "min", "max", "average")):
+        """
+        Per-column statistics keyed like the graph responses, e.g. "total_<metrics1>".
+        """
+        result = {}
+        for name in names:
+            column = self.columns[name]
+            empty = len(column) == 0
+            values = {
+                "total": lambda: column.sum().item(),
+                "min": lambda: 0 if empty else column.min().item(),
+                "max": lambda: 0 if empty else column.max().item(),
+                "average": lambda: 0 if empty else round(column.sum().item() / len(column), 2),
+            }
+            for stat in stats:
+                result[f"{stat}_<{name}>"] = values[stat]()
+        return result
+
+    def to_rows(self):
+        """
+        The row shape the graphs have always returned: [{"_id": date, "metrics1": n, ...}, ...].
+        """
+        names = list(self.columns)
+        columns = [self.columns[name].tolist() for name in names]
+        return [
+            {"_id": date, **dict(zip(names, values))}
+            for date, values in zip(self.dates, zip(*columns) if columns else [() for _ in self.dates])
+        ]
+
+    def to_columnar(self):
+        """
+        The compact shape: {"dates": [...], "metrics1": [...], ...}.
+        """
+        return {"dates": self.dates, **{name: column.tolist() for name, column in self.columns.items()}}
+
+    def serialize(self, shape="rows"):
+        if shape == "columnar":
+            return self.to_columnar()
+        return self.to_rows()
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TZ = "UTC"
+
+
+class InvalidTimezone(ValueError):
+    """
+    Raised for a tz parameter that isn't an IANA timezone name.
+    """
+
+
+def resolve_tz(tz):
+    """
+    Validate an IANA timezone name (e.g. "America/New_York") and return its ZoneInfo.
+    """
+    if not tz:
+        return ZoneInfo(DEFAULT_TZ)
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise InvalidTimezone(f"unknown timezone: {tz}")
+
+
+def local_now(tz=DEFAULT_TZ):
+    return datetime.now(resolve_tz(tz))
+
+
+def day_key(arguments):
+    """
+    Cache key part for results bucketed by day: today's date in the call's tz
+    argument (UTC if it has none), so cached days roll over at local midnight.
+    """
+    return local_now(arguments.get("tz", DEFAULT_TZ)).date().isoformat()
+
+
+def window_start(view_range, tz=DEFAULT_TZ):
+    """
+    The start of a view_range-day window ending now, counted in tz's wall-clock
+    time, as a naive UTC datetime for matching createdAt.
+    """
+    start = local_now(tz) - timedelta(days=view_range)
+    return start.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def with_timezone(operator_args, tz=DEFAULT_TZ):
+    """
+    Add "timezone" to a $dateToString/$dateTrunc argument document. UTC is
+    left implicit so the default pipelines stay as they were.
+    """
+    if tz and tz != DEFAULT_TZ:
+        return {**operator_args, "timezone": tz}
+    return operator_args
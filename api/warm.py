@@ -0,0 +1,124 @@
+import hmac
+import time
+
+from flask import jsonify, request
+
+from cache import refresh
+from catalog import GRAPHS, build_graph
+from config import CRON_SECRET, WARM_PERIODS, WARM_TIMEZONES
+from services.companies_monitor import refresh_completeness
+from services.company_directory import refresh_company_directory
+from services.contact_roles import refresh_contact_roles
+from services.news_monitor import aggregate_bad_news_model_stats, aggregate_total_news_daily
+
+
+def warm_views(periods=WARM_PERIODS, timezones=WARM_TIMEZONES):
+    """
+    Every dashboard view the warmer precomputes: each catalog graph for each
+    standard period and timezone, plus page 1 of total-news-daily and
+    bad-news-model-stats.
+
+    Returns:
+        List of (view, function, args); each call is the one the route makes,
+        so it caches under the key the request path will look up
+    """
+    views = [
+        (f"/graph/{name}?period={period}&tz={tz}", build_graph, (plan, period, tz))
+        for name, plan in GRAPHS.items() for period in periods for tz in timezones
+    ]
+    views.append(("/table/total-news-daily?page=1&page_size=10", aggregate_total_news_daily, (1, 10)))
+    views.extend(
+        (f"/table/bad-news-model-stats?period={period}&tz={tz}", aggregate_bad_news_model_stats, (period, tz))
+        for period in periods for tz in timezones
+    )
+    return views
+
+
+def refresh_side_collections():
+    """
+    Bring the side collections and the company directory up to date on
+    schedule. Requests never build them; a stale one is only queued for a
+    background refresh.
+
+    Returns:
+        Dict of collection -> refresh result
+    """
+    return {
+        "company_completeness": refresh_completeness(),
+        "contact_roles": refresh_contact_roles(),
+        "company_directory": refresh_company_directory(),
+    }
+
+
+def warm(periods=WARM_PERIODS, timezones=WARM_TIMEZONES):
+    """
+    Refresh the side collections, then recompute the standard dashboard views
+    and store them in the result cache.
+
+    The service functions are called directly, inside the caller's context:
+    no nested requests, so the calling request keeps its own budget and
+    query log.
+
+    Returns:
+        Dict with the side-collection refreshes, per-view status and duration,
+        and the total duration
+    """
+    results = []
+    start = time.perf_counter()
+    refreshed = refresh_side_collections()
+    with refresh():
+        for view, fn, args in warm_views(periods, timezones):
+            view_start = time.perf_counter()
+            try:
+                value = fn(*args)
+                status = "partial" if isinstance(value, dict) and value.get("partial") else "ok"
+            except Exception as e:
+                status = f"error: {e}"
+            results.append({
+                "view": view,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - view_start) * 1000, 2),
+            })
+    return {
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "refreshed": refreshed,
+        "results": results,
+    }
+
+
+def init_app(app):
+    """
+    Register /cron/warm for Vercel Cron (or any scheduler). Disabled (404)
+    unless CRON_SECRET is set; the request must send it as
+    "Authorization: Bearer <secret>".
+    """
+
+    @app.route("/cron/warm", methods=["GET", "POST"])
+    def cron_warm():
+        if not CRON_SECRET:
+            return jsonify({"error": "not found"}), 404
+        expected = f"Bearer {CRON_SECRET}".encode()
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            return jsonify({"error": "unauthorized"}), 401
+        try:
+            return jsonify(warm())
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return app
+
+
+if __name__ == "__main__":
+    # Local scheduler entry point, e.g. from crontab:
+    #   */10 * * * * python api/warm.py http://localhost:8000
+    # Goes through the endpoint so the memory backend of the serving process is warmed too.
+    import json
+    import sys
+    import urllib.request
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    warm_request = urllib.request.Request(f"{base_url.rstrip('/')}/cron/warm")
+    if CRON_SECRET:
+        warm_request.add_header("Authorization", f"Bearer {CRON_SECRET}")
+    with urllib.request.urlopen(warm_request, timeout=600) as response:
+        print(json.dumps(json.load(response), indent=2))
@@ -0,0 +1,244 @@
+"""
+HTTP load generator for the dashboard routes.
+
+Runs a weighted mix of dashboard traffic against a running app, either at a
+fixed concurrency (closed loop) or a fixed arrival rate (open loop), and
+reports throughput, p50/p95/p99 latency and error rate per route.
+
+Usage:
+    python bench/loadtest.py --base-url http://localhost:8000 --concurrency 16 --duration 60
+    python bench/loadtest.py --base-url http://localhost:8000 --rate 50 --duration 60
+    python bench/loadtest.py --serve --seed-size 50000 --concurrency 8   # seed and serve locally
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from seed import make_client, seed, use_client
+
+# (weight, path) pairs; roughly what one open dashboard tab requests
+DEFAULT_MIX = [
+    (10, "/graph/contacts?period=30"),
+    (10, "/graph/latest-news?period=30"),
+    (10, "/graph/latest-jobs?period=30"),
+    (10, "/graph/latest-transcripts?period=30"),
+    (10, "/graph/latest-fillings?period=30"),
+    (10, "/graph/error-logs?period=30"),
+    (3, "/graph/error-logs?period=90"),
+    (6, "/table/total-news-daily?page=1&page_size=10"),
+    (2, "/table/total-news-daily?page=2&page_size=10"),
+    (4, "/table/bad-news-model-stats?period=30"),
+    (4, "/table/incomplete-companies"),
+    (4, "/table/edgar-points?period={yesterday}"),
+    (6, "/contacts-data?period=30"),
+    (1, "/download/contacts-stats?period=30"),
+]
+
+
+def load_mix(path):
+    """
+    Read a traffic mix from a JSON file of [weight, path] pairs.
+    """
+    with open(path) as f:
+        return [(float(weight), route) for weight, route in json.load(f)]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """
+    Thread-safe collection of per-route latencies and errors.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = {}
+
+    def record(self, route, latency, ok, size):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            self.bytes[route] = self.bytes.get(route, 0) + size
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        rows = {}
+        all_latencies = []
+        for route, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            all_latencies.extend(latencies)
+            rows[route] = self._row(latencies, self.errors.get(route, 0), elapsed, self.bytes.get(route, 0))
+        all_latencies.sort()
+        rows["TOTAL"] = self._row(all_latencies, sum(self.errors.values()), elapsed, sum(self.bytes.values()))
+        return rows
+
+    @staticmethod
+    def _row(latencies, errors, elapsed, size):
+        count = len(latencies)
+        return {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0,
+            "error_rate": round(errors / count, 4) if count else 0,
+            "avg_bytes": int(size / count) if count else 0,
+        }
+
+
+def route_name(path):
+    return path.split("?")[0]
+
+
+def fire(base_url, path, recorder, timeout):
+    start = time.perf_counter()
+    ok = False
+    size = 0
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+            size = len(response.read())
+            ok = 200 <= response.status < 400
+    except urllib.error.HTTPError as e:
+        size = len(e.read() or b"")
+    except Exception:
+        pass
+    recorder.record(route_name(path), time.perf_counter() - start, ok, size)
+
+
+def run_closed(base_url, mix, concurrency, duration, timeout, rng):
+    """
+    Fixed concurrency: each worker sends its next request as soon as the last one returns.
+    """
+    recorder = Recorder()
+    weights = [w for w, _ in mix]
+    paths = [p for _, p in mix]
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                path = rng.choices(paths, weights)[0]
+            fire(base_url, path, recorder, timeout)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.report(time.perf_counter() - start)
+
+
+def run_open(base_url, mix, rate, duration, timeout, rng, max_in_flight=256):
+    """
+    Fixed arrival rate: requests are started on a Poisson schedule regardless of
+    how long earlier ones take, so queueing shows up in the latencies.
+    """
+    recorder = Recorder()
+    weights = [w for w, _ in mix]
+    paths = [p for _, p in mix]
+    start = time.perf_counter()
+    next_at = start
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while next_at < start + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, base_url, rng.choices(paths, weights)[0], recorder, timeout)
+            next_at += rng.expovariate(rate)
+    return recorder.report(time.perf_counter() - start)
+
+
+def serve_locally(port, seed_size, uri, mongomock):
+    """
+    Seed a database and serve the Flask app on a background thread.
+    """
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    client = make_client(uri, mongomock)
+    if seed_size:
+        seed(client, seed_size)
+    use_client(client)
+    import index
+    use_client(client)
+    server = make_server("127.0.0.1", port, index.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def print_report(rows):
+    print(f"{'route':<34} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}")
+    for route, row in rows.items():
+        print(f"{route:<34} {row['requests']:>7} {row['throughput_rps']:>8} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['error_rate'] * 100:>6.2f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("LOADTEST_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers (ignored with --rate)")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrival rate in requests/second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--mix", default=None, help="JSON file of [weight, path] pairs")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--serve", action="store_true", help="seed and serve the app locally instead of using --base-url")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed-size", type=int, default=0, help="documents to seed before serving (0 keeps existing data)")
+    parser.add_argument("--uri", default=None)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--output", default=None, help="write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url.rstrip("/")
+    server = None
+    if args.serve:
+        server, base_url = serve_locally(args.port, args.seed_size, args.uri, args.mongomock)
+
+    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%m/%d/%Y")
+    mix = load_mix(args.mix) if args.mix else DEFAULT_MIX
+    mix = [(weight, path.format(yesterday=yesterday)) for weight, path in mix]
+    rng = random.Random(args.random_seed)
+
+    try:
+        if args.rate:
+            rows = run_open(base_url, mix, args.rate, args.duration, args.timeout, rng)
+        else:
+            rows = run_closed(base_url, mix, args.concurrency, args.duration, args.timeout, rng)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_report(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "base_url": base_url,
+                "mode": "open" if args.rate else "closed",
+                "rate": args.rate,
+                "concurrency": None if args.rate else args.concurrency,
+                "duration": args.duration,
+                "routes": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
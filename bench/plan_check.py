@@ -0,0 +1,232 @@
+"""
+Query-plan regression checks for every service pipeline.
+
+Runs each service function against a seeded mongod, captures every query it
+issues, explains it with executionStats and checks the winning plan:
+
+  * no COLLSCAN in the winning plan (outside FULL_SCANS) or in any $lookup sub-pipeline,
+  * the expected index is used where one is listed in EXPECTED_INDEXES,
+  * keys examined and docs examined stay within a ratio of docs returned.
+
+Exits non-zero when any check fails, so it can gate CI.
+
+Usage:
+    python bench/plan_check.py --seed-size 20000 --uri mongodb://localhost:27017
+    python bench/plan_check.py --no-seed        # check against data that is already there
+"""
+import argparse
+import sys
+
+from run_services import service_cases
+from seed import make_client, seed, use_client
+
+# Max keys examined / docs returned, and docs examined / docs returned, per query
+DEFAULT_MAX_KEYS_RATIO = 2.0
+DEFAULT_MAX_DOCS_RATIO = 2.0
+
+# (label, namespace) -> index names that are acceptable for the winning plan
+EXPECTED_INDEXES = {
+    ("count_data_by_day", "turf_mvp.contacts"): {"createdAt_1", "email_1_createdAt_1"},
+    ("count_data_by_day", "turf_mvp.datasources"): {"type_1_status_1_createdAt_1"},
+    ("count_data_by_day", "turf_mvp.loggers"): {"source_type_1_status_1_createdAt_1"},
+    ("count_data_by_day", "turf_prototype.scrapper"): {"createdAt_1"},
+    ("count_data_by_day", "turf_prototype.theirstack"): {"createdAt_1"},
+    ("count_data_by_day", "turf_prototype.koyfin_transcript"): {"createdAt_1"},
+    ("count_data_by_day", "turf_prototype.edgar_file"): {"createdAt_1"},
+    ("count_contacts_data_by_day", "turf_mvp.contacts"): {"createdAt_1"},
+    ("count_vt_contacts_exp", "turf_mvp.companyvaluetriggers"): {"createdAt_-1"},
+    ("aggregate_contacts_stats", "turf_mvp.companyvaluetriggers"): {"createdAt_-1"},
+    ("refresh_completeness", "turf_mvp.companies"): {"updatedAt_1"},
+    ("refresh_contact_roles", "turf_mvp.contacts"): {"updatedAt_1"},
+    ("resolve_contact_roles", "turf_mvp.contact_roles"): {"_id_"},
+    ("resolve_contact_roles", "turf_mvp.contacts"): {"_id_"},
+    ("company_directory_refresh", "turf_mvp.companies"): {"updatedAt_1"},
+    ("company_directory_lookup", "turf_mvp.companies"): {"_id_"},
+    ("get_company_monitor", "turf_mvp.company_completeness"): {"mask_1_incompleteAt_1", "mask_1_fixedAt_1"},
+    ("aggregate_total_news_daily", "turf_mvp.companies"): {"status_1_name_1"},
+    ("aggregate_bad_news_model_stats", "turf_mvp.companies"): {"has_bad_news_source_1"},
+    ("get_edgar_data_by_date", "turf_mvp.datasources"): {"type_1_status_1_createdAt_1", "raw_source_id_1"},
+    ("get_edgar_data_by_date", "turf_prototype.edgar_file"): {"createdAt_1"},
+}
+
+# (label, namespace) -> (max keys ratio, max docs ratio) where the defaults don't fit,
+# e.g. the filter is only partly covered by an index by design.
+RATIO_OVERRIDES = {
+    # Multiple-active-experience is checked after the createdAt range scan
+    ("count_contacts_data_by_day", "turf_mvp.contacts"): (2.0, None),
+    # vt_contacts non-empty is a residual filter on the createdAt range
+    ("count_vt_contacts_exp", "turf_mvp.companyvaluetriggers"): (2.0, 3.0),
+    ("aggregate_contacts_stats", "turf_mvp.companyvaluetriggers"): (2.0, 3.0),
+    # Sampled documents are filtered after $sample, so most of them are dropped by design
+    ("count_data_by_day_approx", "turf_mvp.loggers"): (None, None),
+}
+
+# (label, namespace) pairs that read a whole collection on purpose
+FULL_SCANS = {
+    # The company directory is bulk-loaded, then refreshed by updatedAt
+    ("company_directory_load", "turf_mvp.companies"),
+    # $sample reads a random cursor, but falls back to a COLLSCAN and random sort
+    # when the sample is 5% or more of the collection, as on small seeds
+    ("count_data_by_day_approx", "turf_mvp.loggers"),
+}
+
+
+def _walk_plan(plan, stages, indexes):
+    if not isinstance(plan, dict):
+        return
+    # Slot-based engine nests the classic plan under queryPlan
+    if "queryPlan" in plan:
+        _walk_plan(plan["queryPlan"], stages, indexes)
+        return
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    if "indexName" in plan:
+        indexes.add(plan["indexName"])
+    for key in ("inputStage", "outerStage", "innerStage"):
+        _walk_plan(plan.get(key), stages, indexes)
+    for child in plan.get("inputStages", []):
+        _walk_plan(child, stages, indexes)
+
+
+def summarize_explain(explain):
+    """
+    Reduce an explain("executionStats") document to the parts the checks use.
+
+    Returns:
+        Dict with winning-plan stages, index names, keys/docs examined, docs
+        returned from the query layer, and per-$lookup scan statistics
+    """
+    summary = {"stages": [], "indexes": set(), "keys_examined": 0, "docs_examined": 0, "returned": 0, "lookups": []}
+
+    def visit(node):
+        if isinstance(node, list):
+            for item in node:
+                visit(item)
+            return
+        if not isinstance(node, dict):
+            return
+        if "queryPlanner" in node:
+            _walk_plan(node["queryPlanner"].get("winningPlan"), summary["stages"], summary["indexes"])
+            stats = node.get("executionStats", {})
+            summary["keys_examined"] += stats.get("totalKeysExamined", 0)
+            summary["docs_examined"] += stats.get("totalDocsExamined", 0)
+            summary["returned"] += stats.get("nReturned", 0)
+        if "$lookup" in node and "collectionScans" in node:
+            summary["lookups"].append({
+                "from": node["$lookup"].get("from"),
+                "collection_scans": node.get("collectionScans", 0),
+                "indexes_used": node.get("indexesUsed", []),
+            })
+        for key, value in node.items():
+            if key != "queryPlanner":
+                visit(value)
+
+    visit(explain)
+    return summary
+
+
+def check_query(query, summary):
+    """
+    Return a list of failure messages for one captured query.
+    """
+    key = (query["label"], query["namespace"])
+    failures = []
+
+    if "COLLSCAN" in summary["stages"] and key not in FULL_SCANS:
+        failures.append(f"winning plan is a COLLSCAN ({' > '.join(summary['stages'])})")
+    for lookup in summary["lookups"]:
+        if lookup["collection_scans"]:
+            failures.append(f"$lookup from {lookup['from']} ran {lookup['collection_scans']} collection scans")
+
+    expected = EXPECTED_INDEXES.get(key)
+    if expected and not (summary["indexes"] & expected):
+        failures.append(f"expected one of {sorted(expected)}, plan used {sorted(summary['indexes']) or 'no index'}")
+
+    max_keys, max_docs = RATIO_OVERRIDES.get(key, (DEFAULT_MAX_KEYS_RATIO, DEFAULT_MAX_DOCS_RATIO))
+    returned = max(summary["returned"], 1)
+    if max_keys is not None and summary["keys_examined"] / returned > max_keys:
+        failures.append(f"keys examined/returned {summary['keys_examined']}/{summary['returned']} exceeds {max_keys}")
+    if max_docs is not None and summary["docs_examined"] / returned > max_docs:
+        failures.append(f"docs examined/returned {summary['docs_examined']}/{summary['returned']} exceeds {max_docs}")
+    return failures
+
+
+def explain(query):
+    return query["collection"].database.command("explain", query["command"], verbosity="executionStats")
+
+
+def check_case(case, fn, log=print):
+    """
+    Run one service case, explain each distinct query it issues and check it.
+
+    Returns:
+        List of (label, namespace, failures) tuples for queries that failed
+    """
+    from cache import refresh
+    from instrumentation import capture_queries
+
+    # Bypass cached results so the case issues its queries
+    with capture_queries() as captured, refresh():
+        fn()
+    failed = []
+    seen = set()
+    for query in captured:
+        if query["command"] is None:
+            continue
+        # Per-document lookups repeat the same shape; one explain is enough
+        shape = (query["label"], query["namespace"], query["op"], query["shape"])
+        if shape in seen:
+            continue
+        seen.add(shape)
+
+        summary = summarize_explain(explain(query))
+        failures = check_query(query, summary)
+        status = "FAIL" if failures else "ok"
+        log(f"{status:<4} {case:<50} {query['op']:<9} {query['namespace']:<32} "
+            f"{'>'.join(summary['stages']) or '-'} keys={summary['keys_examined']} "
+            f"docs={summary['docs_examined']} returned={summary['returned']}")
+        for failure in failures:
+            log(f"       - {failure}")
+        if failures:
+            failed.append((query["label"], query["namespace"], failures))
+    return failed
+
+
+def run_checks(only=None, log=print):
+    """
+    Check every service case (see check_case).
+
+    Returns:
+        List of (case, label, namespace, failures) tuples for queries that failed
+    """
+    failed = []
+    for case, fn in service_cases():
+        if only and only not in case:
+            continue
+        failed.extend((case, *failure) for failure in check_case(case, fn, log))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=None)
+    parser.add_argument("--seed-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="use the data already in the database")
+    parser.add_argument("--only", default=None, help="only check cases whose name contains this")
+    args = parser.parse_args(argv)
+
+    client = make_client(args.uri)
+    if not args.no_seed:
+        seed(client, args.seed_size, args.seed, log=lambda line: None)
+    use_client(client)
+
+    failed = run_checks(args.only)
+    if failed:
+        print(f"\n{len(failed)} query plan check(s) failed")
+        sys.exit(1)
+    print("\nall query plans ok")
+
+
+if __name__ == "__main__":
+    main()
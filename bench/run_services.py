@@ -0,0 +1,185 @@
+"""
+Service-level benchmarks for every function in api/services.
+
+Seeds the database at each requested size (see seed.py), times each service
+function and writes the results as JSON so runs can be compared.
+
+Usage:
+    python bench/run_services.py --sizes 10000,100000 --uri mongodb://localhost:27017
+    python bench/run_services.py --sizes 10000 --mongomock --repeat 3
+    python bench/run_services.py --compare bench/results/old.json bench/results/new.json
+
+The same cases run under pytest-benchmark at one seed size in
+tests/test_service_benchmarks.py.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from seed import API_DIR, make_client, seed, use_client
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def catalog_cases(period):
+    """
+    One count_data_by_day case per distinct collection and filter in the metric catalog.
+    """
+    from catalog import GRAPHS
+    from services.graph import count_data_by_day
+
+    plans = {}
+    for graph in GRAPHS.values():
+        for metric in graph.metrics:
+            if metric.counter == "count_data_by_day":
+                plans.setdefault((metric.db_name, metric.col_name, metric.match), f"{graph.name}.{metric.name}")
+    return [
+        (f"graph.count_data_by_day[{name},{period}]",
+         lambda db_name=db_name, col_name=col_name, match=match: count_data_by_day(db_name, col_name, period, match.to_dict()))
+        for (db_name, col_name, match), name in plans.items()
+    ]
+
+
+def service_cases():
+    """
+    (name, callable) pairs covering every public function in api/services.
+    """
+    from services.graph import count_data_by_day, estimate_data_by_day
+    from timeseries import TimeSeries
+    from services.news_monitor import aggregate_bad_news_model_stats, aggregate_total_news_daily
+    from services.companies_monitor import get_company_monitor, refresh_completeness
+    from services.contact_roles import refresh_contact_roles
+    from services.point_data import get_edgar_data_by_date
+    from services.contacts_monitor import (
+        aggregate_contacts_stats, count_contacts_data_by_day, count_vt_contacts_exp,
+    )
+
+    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%m/%d/%Y")
+    daily = [{"_id": (datetime.utcnow() - timedelta(days=d)).strftime("%Y-%m-%d"), "count": d} for d in range(0, 180, 2)]
+
+    return [
+        ("timeseries.from_counts[2x180]", lambda: TimeSeries.from_counts([daily, daily], 180).add_ratio("metrics3", "metrics1", "metrics2").to_rows()),
+        *catalog_cases(30),
+        ("graph.count_data_by_day[loggers_error,180]", lambda: count_data_by_day("turf_mvp", "loggers", 180, {"source_type": "edgar", "status": "error"})),
+        # The sampled estimate itself; count_data_by_day_approx would return the exact result cached above
+        ("graph.estimate_data_by_day[loggers_error,180]", lambda: estimate_data_by_day("turf_mvp", "loggers", 180, {"source_type": "edgar", "status": "error"}, sample_size=1000)),
+        ("contact_roles.refresh_contact_roles", refresh_contact_roles),
+        ("contacts_monitor.count_contacts_data_by_day[30]", lambda: count_contacts_data_by_day(30)),
+        ("contacts_monitor.count_vt_contacts_exp[30]", lambda: count_vt_contacts_exp(30)),
+        ("contacts_monitor.aggregate_contacts_stats[30]", lambda: aggregate_contacts_stats(30)),
+        # Before get_company_monitor, which reads the tracker this fills
+        ("companies_monitor.refresh_completeness", refresh_completeness),
+        ("companies_monitor.get_company_monitor", get_company_monitor),
+        ("news_monitor.aggregate_total_news_daily[page1]", lambda: aggregate_total_news_daily(1, 10)),
+        ("news_monitor.aggregate_bad_news_model_stats[30]", lambda: aggregate_bad_news_model_stats(30)),
+        ("point_data.get_edgar_data_by_date[yesterday]", lambda: get_edgar_data_by_date(yesterday)),
+    ]
+
+
+def time_case(fn, repeat, warmup=1):
+    """
+    Time fn with result-cache lookups bypassed, so every repeat runs its queries.
+    """
+    from cache import refresh
+
+    samples = []
+    with refresh():
+        for _ in range(warmup):
+            fn()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+        "repeat": repeat,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(client, sizes, repeat, seed_value, only=None):
+    use_client(client)
+    results = {
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "revision": git_revision(),
+        "backend": type(client).__module__.split(".")[0],
+        "seed": seed_value,
+        "sizes": {},
+    }
+    for size in sizes:
+        print(f"== size {size}")
+        seed(client, size, seed_value, log=lambda line: print(f"   {line}"))
+        use_client(client)
+        cases = {}
+        for name, fn in service_cases():
+            if only and only not in name:
+                continue
+            try:
+                cases[name] = time_case(fn, repeat)
+                print(f"   {name}: median {cases[name]['median_ms']} ms")
+            except Exception as e:
+                cases[name] = {"error": str(e)}
+                print(f"   {name}: error {e}")
+        results["sizes"][str(size)] = cases
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'size':>9}  {'case':<55} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for size, cases in new["sizes"].items():
+        for name, result in cases.items():
+            before = old["sizes"].get(size, {}).get(name, {})
+            if "median_ms" not in result or "median_ms" not in before:
+                continue
+            ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            print(f"{size:>9}  {name:<55} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} {ratio:>6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000", help="comma separated seed sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--uri", default=None)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--only", default=None, help="only run cases whose name contains this")
+    parser.add_argument("--output", default=None, help="results file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    client = make_client(args.uri, args.mongomock)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(client, sizes, args.repeat, args.seed, args.only)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Seeded synthetic data generator for the turf_mvp / turf_prototype databases.
+
+Fills a local mongod (or mongomock for small runs) with documents shaped like
+production: contacts with coresignal_data.experience arrays (see
+api/services/am.json), companies, companyvaluetriggers with vt_contacts,
+loggers, datasources, status docs and the turf_prototype raw collections.
+
+Usage:
+    python bench/seed.py --size 100000 --uri mongodb://localhost:27017
+    python bench/seed.py --size 10000 --mongomock
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+sys.path.insert(0, API_DIR)
+
+from bson import ObjectId  # noqa: E402
+
+DEFAULT_URI = "mongodb://localhost:27017"
+BATCH_SIZE = 5000
+
+# Share of --size given to each collection
+MIX = {
+    ("turf_mvp", "companies"): 0.01,
+    ("turf_mvp", "contacts"): 0.25,
+    ("turf_mvp", "companyvaluetriggers"): 0.05,
+    ("turf_mvp", "loggers"): 0.30,
+    ("turf_mvp", "datasources"): 0.15,
+    ("turf_mvp", "status"): 0.04,
+    ("turf_prototype", "scrapper"): 0.06,
+    ("turf_prototype", "theirstack"): 0.05,
+    ("turf_prototype", "koyfin_transcript"): 0.02,
+    ("turf_prototype", "edgar_file"): 0.07,
+}
+
+# Side collections the services derive from the seeded data; dropped with it
+DERIVED_COLLECTIONS = [
+    ("turf_mvp", "company_completeness"),
+    ("turf_mvp", "company_completeness_state"),
+    ("turf_mvp", "contact_roles"),
+    ("turf_mvp", "contact_roles_state"),
+]
+
+SOURCE_TYPES = ["scrapper", "jobsearch", "transcript", "edgar", "apollo", "crunchbase", "manual"]
+DATASOURCE_TYPES = ["scrapper", "jobsearch", "transcript", "edgar"]
+LOG_STEPS = ["STEP: trim_and_validate", "STEP: fetch", "STEP: classify", "STEP: store"]
+MODELS = ["gpt-4.1", "gpt-4o-mini"]
+TITLES = [
+    "Co-founder", "Chief Executive Officer", "Chief Financial Officer", "VP Engineering",
+    "Director Of Bell Operations", "Head of Sales", "Software Engineer", "Product Manager",
+    "Marketing Manager", "Board Member", "Advisor", "Operations Lead",
+]
+DEPARTMENTS = ["C-Suite", "Engineering", "Sales", "Marketing", "Operations", None]
+LEVELS = ["Founder", "C-Level", "VP", "Director", "Manager", "Senior", None]
+INDUSTRIES = ["Software", "Finance", "Healthcare", "Retail", "Energy", "Media"]
+
+
+def object_id(rng):
+    return ObjectId(rng.randbytes(12))
+
+
+def created_at(rng, now, days):
+    return now - timedelta(days=rng.random() * days)
+
+
+def maybe(rng, value, none_rate):
+    return None if rng.random() < none_rate else value
+
+
+def make_company(rng, now, days, i):
+    return {
+        "_id": object_id(rng),
+        "name": f"Company {i:06d}",
+        "status": "Active" if rng.random() < 0.8 else "Inactive",
+        "has_bad_news_source": rng.random() < 0.3,
+        "estimated_num_employees": maybe(rng, rng.randint(5, 50000), 0.1),
+        "primary_industries": [] if rng.random() < 0.1 else rng.sample(INDUSTRIES, rng.randint(1, 2)),
+        "annual_revenue": maybe(rng, rng.randint(10**5, 10**10), 0.15),
+        "city": maybe(rng, "Austin", 0.05),
+        "state": maybe(rng, "TX", 0.05),
+        "country": maybe(rng, "United States", 0.03),
+        "website": maybe(rng, f"https://company{i}.example.com", 0.05),
+        "linkedin_url": maybe(rng, f"https://linkedin.com/company/company{i}", 0.1),
+        "createdAt": created_at(rng, now, days * 3),
+        "updatedAt": created_at(rng, now, days),
+    }
+
+
+def make_experience(rng):
+    experiences = []
+    for order in range(1, rng.randint(1, 8) + 1):
+        experiences.append({
+            "active_experience": 1 if order == 1 or rng.random() < 0.15 else 0,
+            "position_title": rng.choice(TITLES),
+            "department": rng.choice(DEPARTMENTS),
+            "management_level": rng.choice(LEVELS),
+            "order_in_profile": order,
+        })
+    return experiences
+
+
+def make_contact(rng, now, days, i):
+    experience = make_experience(rng)
+    active = experience[0]
+    return {
+        "_id": object_id(rng),
+        "name": f"Contact {i}",
+        "email": maybe(rng, f"contact{i}@example.com", 0.3),
+        "linkedin_url": maybe(rng, f"https://linkedin.com/in/contact{i}", 0.2),
+        "coresignal_data": {
+            "id": rng.randint(10**8, 10**9),
+            "active_experience_title": active["position_title"],
+            "active_experience_department": active["department"],
+            "active_experience_management_level": active["management_level"],
+            "is_decision_maker": rng.randint(0, 1),
+            "total_experience_duration_months": rng.randint(1, 480),
+            "experience": experience,
+        },
+        "createdAt": created_at(rng, now, days),
+        "updatedAt": created_at(rng, now, days),
+        "__v": 1,
+    }
+
+
+def make_value_trigger(rng, now, days, companies, contacts):
+    vt_contacts = []
+    for contact in rng.sample(contacts, min(len(contacts), rng.randint(0, 4))):
+        experience = contact["coresignal_data"]["experience"]
+        vt_contacts.append({
+            "contact_id": contact["_id"],
+            "name": contact["name"],
+            "email": contact["email"],
+            "linkedin_url": contact["linkedin_url"],
+            "current_role": rng.choice(experience)["position_title"],
+        })
+    return {
+        "_id": object_id(rng),
+        "company_id": rng.choice(companies)["_id"],
+        "vt_title": f"Value trigger {rng.randint(1, 10**6)}",
+        "vt_contacts": vt_contacts,
+        "createdAt": created_at(rng, now, days),
+    }
+
+
+def make_logger(rng, now, days, companies):
+    source_type = rng.choice(SOURCE_TYPES)
+    return {
+        "_id": object_id(rng),
+        "company_id": rng.choice(companies)["_id"],
+        "source_type": source_type,
+        "status": "error" if rng.random() < 0.2 else "success",
+        "step": rng.choice(LOG_STEPS),
+        "openai_data": {"openai_model": rng.choice(MODELS)},
+        "createdAt": created_at(rng, now, days),
+    }
+
+
+def make_raw(rng, now, days, companies, col_name):
+    doc = {
+        "_id": object_id(rng),
+        "company_id": rng.choice(companies)["_id"],
+        "createdAt": created_at(rng, now, days),
+    }
+    if col_name == "edgar_file":
+        doc["file_date"] = doc["createdAt"].strftime("%Y-%m-%d")
+        doc["file_url"] = f"https://www.sec.gov/Archives/edgar/{doc['_id']}.htm"
+    else:
+        doc["url"] = f"https://source.example.com/{col_name}/{doc['_id']}"
+    return doc
+
+
+def make_datasource(rng, now, days, companies, raw_ids):
+    ds_type = rng.choice(DATASOURCE_TYPES)
+    raw_id = rng.choice(raw_ids[ds_type]) if raw_ids.get(ds_type) else None
+    return {
+        "_id": object_id(rng),
+        "company_id": rng.choice(companies)["_id"],
+        "type": ds_type,
+        "status": "Active" if rng.random() < 0.85 else "Inactive",
+        "raw_source_id": raw_id,
+        "url": f"https://source.example.com/{ds_type}/{raw_id}",
+        "date": created_at(rng, now, days).strftime("%m/%d/%Y"),
+        "createdAt": created_at(rng, now, days),
+    }
+
+
+def make_status(rng, now, days, companies):
+    return {
+        "_id": object_id(rng),
+        "type": "news_count",
+        "name": str(rng.choice(companies)["_id"]),
+        "value": rng.randint(0, 200),
+        "createdAt": created_at(rng, now, min(days, 7)),
+    }
+
+
+def _insert(collection, docs):
+    batch = []
+    inserted = 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+
+def seed(client, size, seed_value=42, days=200, drop=True, create_indexes=True, log=print):
+    """
+    Fill turf_mvp and turf_prototype with roughly `size` synthetic documents.
+
+    Args:
+        client: MongoClient (or mongomock client) to write to
+        size: Approximate total number of documents across all collections
+        seed_value: Random seed; the same seed and size produce the same data
+        days: createdAt values are spread over this many days back from now
+        drop: Drop the seeded collections first
+        create_indexes: Create the indexes from api/indexes.py afterwards
+
+    Returns:
+        Dict of "db.collection" -> documents inserted
+    """
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    counts = {key: max(1, int(size * share)) for key, share in MIX.items()}
+    inserted = {}
+
+    if drop:
+        for db_name, col_name in list(MIX) + DERIVED_COLLECTIONS:
+            client[db_name][col_name].drop()
+
+    def run(key, docs):
+        db_name, col_name = key
+        start = time.perf_counter()
+        inserted[f"{db_name}.{col_name}"] = _insert(client[db_name][col_name], docs)
+        log(f"seeded {db_name}.{col_name}: {inserted[f'{db_name}.{col_name}']} docs in {time.perf_counter() - start:.1f}s")
+
+    # Companies and a sample of contacts are kept in memory so that other
+    # collections can reference them; everything else is streamed.
+    companies = [make_company(rng, now, days, i) for i in range(counts[("turf_mvp", "companies")])]
+    run(("turf_mvp", "companies"), companies)
+
+    contact_sample = []
+    sample_size = 10000
+
+    def contacts():
+        for i in range(counts[("turf_mvp", "contacts")]):
+            contact = make_contact(rng, now, days, i)
+            if len(contact_sample) < sample_size:
+                contact_sample.append(contact)
+            elif rng.random() < 0.01:
+                contact_sample[rng.randrange(sample_size)] = contact
+            yield contact
+
+    run(("turf_mvp", "contacts"), contacts())
+    run(("turf_mvp", "companyvaluetriggers"), (
+        make_value_trigger(rng, now, days, companies, contact_sample)
+        for _ in range(counts[("turf_mvp", "companyvaluetriggers")])
+    ))
+    run(("turf_mvp", "loggers"), (
+        make_logger(rng, now, days, companies) for _ in range(counts[("turf_mvp", "loggers")])
+    ))
+    run(("turf_mvp", "status"), (
+        make_status(rng, now, days, companies) for _ in range(counts[("turf_mvp", "status")])
+    ))
+
+    raw_types = {"scrapper": "scrapper", "theirstack": "jobsearch", "koyfin_transcript": "transcript", "edgar_file": "edgar"}
+    raw_ids = {}
+    for col_name, ds_type in raw_types.items():
+        ids = []
+
+        def raw_docs(col_name=col_name, ids=ids):
+            for _ in range(counts[("turf_prototype", col_name)]):
+                doc = make_raw(rng, now, days, companies, col_name)
+                if len(ids) < sample_size:
+                    ids.append(doc["_id"])
+                yield doc
+
+        run(("turf_prototype", col_name), raw_docs())
+        raw_ids[ds_type] = ids
+
+    run(("turf_mvp", "datasources"), (
+        make_datasource(rng, now, days, companies, raw_ids) for _ in range(counts[("turf_mvp", "datasources")])
+    ))
+
+    if create_indexes:
+        from indexes import ensure_indexes
+        ensure_indexes(client)
+
+    return inserted
+
+
+def make_client(uri=None, mongomock=False):
+    """
+    Build the client the generator and benchmarks run against.
+    """
+    if mongomock:
+        import mongomock as mm
+        return mm.MongoClient()
+    from pymongo import MongoClient
+    return MongoClient(uri or os.getenv("BENCH_MONGO_URI", DEFAULT_URI))
+
+
+def use_client(client):
+    """
+    Point the app config and every service module at `client`.
+    """
+    import config
+    config.client = client
+    for module_name, module in list(sys.modules.items()):
+        if module_name.startswith("services.") and hasattr(module, "client"):
+            module.client = client
+    # The company directory keeps companies read through the previous client
+    directory = sys.modules.get("services.company_directory")
+    if directory is not None:
+        directory.reset_company_directory()
+    # Results cached from the previous client (or seed size) would be served as hits
+    cache = sys.modules.get("cache")
+    if cache is not None:
+        cache.result_cache.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10000, help="approximate total documents (10k - 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=200, help="spread createdAt over this many days")
+    parser.add_argument("--uri", default=None, help=f"MongoDB URI (default $BENCH_MONGO_URI or {DEFAULT_URI})")
+    parser.add_argument("--mongomock", action="store_true", help="seed an in-memory mongomock client (small runs only)")
+    parser.add_argument("--no-drop", action="store_true", help="append instead of replacing existing data")
+    args = parser.parse_args(argv)
+
+    client = make_client(args.uri, args.mongomock)
+    start = time.perf_counter()
+    inserted = seed(client, args.size, args.seed, args.days, drop=not args.no_drop)
+    print(f"seeded {sum(inserted.values())} docs in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from cache import CacheBackend, MemoryBackend, RedisBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_entries=8)
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBackend(client=fakeredis.FakeRedis())
+
+
+def test_get_missing(backend):
+    assert backend.get("missing") is None
+
+
+def test_set_get_round_trip(backend):
+    value = {"_id": ObjectId(), "createdAt": datetime(2024, 1, 2, 3, 4, 5), "rows": [{"count": 1}]}
+    backend.set("k", value, 60)
+    assert backend.get("k") == value
+
+
+def test_large_value_round_trip(backend):
+    value = [{"_id": f"2024-01-{i % 28 + 1:02d}", "count": i} for i in range(500)]
+    backend.set("big", value, 60)
+    assert backend.get("big") == value
+
+
+def test_ttl_expires(backend):
+    backend.set("short", 1, 0.05)
+    backend.set("long", 2, 60)
+    time.sleep(0.1)
+    assert backend.get("short") is None
+    assert backend.get("long") == 2
+
+
+def test_delete_and_clear(backend):
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    backend.delete("a")
+    assert backend.get("a") is None
+    assert backend.get("b") == 2
+    backend.clear()
+    assert backend.get("b") is None
+
+
+def test_lock_is_exclusive(backend):
+    token = backend.acquire_lock("k", 60)
+    assert token is not None
+    assert backend.acquire_lock("k", 60) is None
+    # Other keys are unaffected
+    assert backend.acquire_lock("other", 60) is not None
+
+
+def test_release_needs_the_holders_token(backend):
+    token = backend.acquire_lock("k", 60)
+    backend.release_lock("k", "not-the-token")
+    assert backend.acquire_lock("k", 60) is None
+    backend.release_lock("k", token)
+    assert backend.acquire_lock("k", 60) is not None
+
+
+def test_lock_expires(backend):
+    assert backend.acquire_lock("k", 0.05) is not None
+    time.sleep(0.1)
+    assert backend.acquire_lock("k", 60) is not None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    backend.get("a")
+    backend.set("c", 3, 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+    class Partial(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
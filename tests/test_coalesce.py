@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import ExecutionTimeout
+
+import timezones
+from budget import time_budget
+from cache import MemoryBackend, cached
+from coalesce import CoalesceTimeout, SingleFlight
+
+CALLERS = 8
+
+
+def _run_concurrently(target, callers=CALLERS):
+    """
+    Start callers threads on target at once. Returns each one's result or exception.
+    """
+    results = [None] * callers
+    start = threading.Barrier(callers)
+
+    def run(i):
+        start.wait()
+        try:
+            results[i] = target(i)
+        except BaseException as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SlowQuery:
+    """
+    Stands in for a service query: counts executions and takes a while.
+    """
+
+    def __init__(self, seconds=0.2, error=None):
+        self.seconds = seconds
+        self.error = error
+        self.executions = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            self.executions += 1
+        time.sleep(self.seconds)
+        if self.error is not None:
+            raise self.error
+        return {"rows": [{"_id": "2024-01-01", "count": 3}]}
+
+
+def test_single_flight_runs_once_for_concurrent_callers():
+    flight, query = SingleFlight("test"), SlowQuery()
+    results = _run_concurrently(lambda i: flight.do("key", query, timeout=5))
+    assert query.executions == 1
+    assert all(result == {"rows": [{"_id": "2024-01-01", "count": 3}]} for result in results)
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_shares_the_error():
+    flight, query = SingleFlight("test"), SlowQuery(error=ExecutionTimeout("operation exceeded time limit", code=50))
+    results = _run_concurrently(lambda i: flight.do("key", query, timeout=5))
+    assert query.executions == 1
+    assert all(isinstance(result, ExecutionTimeout) for result in results)
+
+
+def test_single_flight_waiter_times_out():
+    flight, query = SingleFlight("test"), SlowQuery(seconds=0.5)
+    leader = threading.Thread(target=flight.do, args=("key", query))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(CoalesceTimeout):
+        flight.do("key", query, timeout=0.05)
+    leader.join()
+    assert query.executions == 1
+
+
+def test_cached_runs_once_for_concurrent_callers():
+    query = SlowQuery()
+
+    def count_by_day(view_range):
+        return query(view_range)
+
+    service = cached(count_by_day, cache=MemoryBackend())
+    results = _run_concurrently(lambda i: service(30))
+    assert query.executions == 1
+    assert all(result == {"rows": [{"_id": "2024-01-01", "count": 3}]} for result in results)
+    # Later calls are cache hits
+    assert service(30) == results[0]
+    assert query.executions == 1
+
+
+def test_cached_propagates_timeouts_to_waiters():
+    query = SlowQuery(error=ExecutionTimeout("operation exceeded time limit", code=50))
+
+    def count_by_day(view_range):
+        return query(view_range)
+
+    service = cached(count_by_day, cache=MemoryBackend())
+    results = _run_concurrently(lambda i: service(30))
+    assert query.executions == 1
+    assert all(isinstance(result, ExecutionTimeout) for result in results)
+
+
+def test_cached_waiters_stop_at_their_budget():
+    query = SlowQuery(seconds=0.5)
+
+    def count_by_day(view_range):
+        return query(view_range)
+
+    service = cached(count_by_day, cache=MemoryBackend())
+
+    def call(i):
+        if i == 0:
+            return service(30)
+        time.sleep(0.05)
+        with time_budget(100):
+            return service(30)
+
+    results = _run_concurrently(call, callers=4)
+    assert query.executions == 1
+    assert results[0] == {"rows": [{"_id": "2024-01-01", "count": 3}]}
+    assert all(isinstance(result, CoalesceTimeout) for result in results[1:])
+
+
+def test_cached_key_rolls_over_with_the_day(monkeypatch):
+    query = SlowQuery(seconds=0)
+
+    def count_by_day(view_range, tz=timezones.DEFAULT_TZ):
+        return query(view_range, tz)
+
+    service = cached(count_by_day, cache=MemoryBackend(), vary=timezones.day_key)
+    monkeypatch.setattr(timezones, "local_now", lambda tz: datetime(2024, 1, 1, 23, 59, tzinfo=timezone.utc))
+    service(30)
+    service(30)
+    assert query.executions == 1
+    assert service.peek(30) is not None
+
+    monkeypatch.setattr(timezones, "local_now", lambda tz: datetime(2024, 1, 2, 0, 1, tzinfo=timezone.utc))
+    assert service.peek(30) is None
+    service(30)
+    assert query.executions == 2
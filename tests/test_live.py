@@ -0,0 +1,170 @@
+"""
+Live counters: the filter evaluator, change application and SSE output.
+
+The change-stream cases need a replica set (a single node is enough) whose
+turf_live_test database they may drop: set LIVE_TEST_MONGO_URI, e.g.
+mongodb://localhost:27017/?replicaSet=rs0, to enable them.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from live import LiveCounters, _day_bounds, matches, sse_events
+
+TEST_DB = "turf_live_test"
+# Two counters on one collection: every document, and errors only
+COUNTERS = [
+    ("events", "metrics1", TEST_DB, "events", {}, None, None),
+    ("events", "metrics2", TEST_DB, "events", {"status": "error", "source_type": {"$nin": ["edgar"]}}, None, None),
+]
+
+
+@pytest.mark.parametrize("doc, query, expected", [
+    ({"status": "error"}, {"status": "error"}, True),
+    ({"status": "ok"}, {"status": "error"}, False),
+    ({}, {"email": None}, True),
+    ({"email": None}, {"email": None}, True),
+    ({"email": "a@b"}, {"email": None}, False),
+    ({"type": "edgar"}, {"type": {"$in": ["edgar", "scrapper"]}}, True),
+    ({"type": "apollo"}, {"type": {"$in": ["edgar", "scrapper"]}}, False),
+    ({"type": "apollo"}, {"type": {"$nin": ["edgar", "scrapper"]}}, True),
+    ({}, {"type": {"$nin": ["edgar"]}}, True),
+    ({"type": "edgar"}, {"type": {"$ne": "edgar"}}, False),
+    ({"a": {"b": 1}}, {"a.b": {"$exists": True}}, True),
+    ({"a": {}}, {"a.b": {"$exists": True}}, False),
+    ({"a": {}}, {"a.b": {"$exists": False}}, True),
+    ({"status": "error", "type": "edgar"}, {"status": "error", "type": {"$ne": "edgar"}}, False),
+])
+def test_matches(doc, query, expected):
+    assert matches(doc, query) is expected
+
+
+def _change(op, doc_id, doc=None, coll="events"):
+    return {"operationType": op, "ns": {"db": TEST_DB, "coll": coll}, "documentKey": {"_id": doc_id}, "fullDocument": doc}
+
+
+def _counts(counters):
+    return counters.snapshot()["graphs"]["events"]
+
+
+@pytest.fixture
+def counters():
+    # Counting today without a database: reset() would load today's members
+    counters = LiveCounters(None, counters=COUNTERS)
+    counters.day = _day_bounds()[0]
+    return counters
+
+
+def test_apply_change_counts_inserts_updates_and_deletes(counters):
+    now = datetime.utcnow()
+    error_id, ok_id = ObjectId(), ObjectId()
+
+    assert counters.apply_change(_change("insert", error_id, {"_id": error_id, "createdAt": now, "status": "error"}))
+    assert counters.apply_change(_change("insert", ok_id, {"_id": ok_id, "createdAt": now, "status": "ok"}))
+    assert _counts(counters) == {"metrics1": 2, "metrics2": 1}
+
+    # An update that moves a document out of one filter only
+    fixed = {"_id": error_id, "createdAt": now, "status": "ok"}
+    assert counters.apply_change(_change("update", error_id, fixed))
+    assert _counts(counters) == {"metrics1": 2, "metrics2": 0}
+
+    # Re-applying the same state changes nothing
+    assert not counters.apply_change(_change("update", error_id, fixed))
+
+    assert counters.apply_change(_change("delete", ok_id))
+    assert _counts(counters) == {"metrics1": 1, "metrics2": 0}
+
+
+def test_apply_change_ignores_other_days_and_collections(counters):
+    doc_id = ObjectId()
+    yesterday = datetime(2000, 1, 1)
+    assert not counters.apply_change(_change("insert", doc_id, {"_id": doc_id, "createdAt": yesterday}))
+    assert not counters.apply_change(_change("insert", doc_id, {"_id": doc_id, "createdAt": datetime.utcnow()}, coll="other"))
+    assert _counts(counters) == {"metrics1": 0, "metrics2": 0}
+
+
+def test_snapshot_computes_catalog_ratios():
+    counters = LiveCounters(None, counters=[
+        ("latest-news", "metrics1", "turf_mvp", "datasources", {}, None, None),
+        ("latest-news", "metrics2", "turf_prototype", "scrapper", {}, None, None),
+    ])
+    counters.day = _day_bounds()[0]
+    counters.members = [{1}, {1, 2, 3, 4}]
+    assert counters.snapshot("latest-news")["graphs"] == {"latest-news": {"metrics1": 1, "metrics2": 4, "metrics3": 25.0}}
+
+
+def test_sse_events_sends_snapshot_then_heartbeat(counters):
+    events = sse_events(counters, heartbeat=0.01)
+    first = next(events)
+    lines = first.rstrip("\n").split("\n")
+    assert lines[0] == f"id: {counters.version}"
+    assert lines[1] == "event: counters"
+    assert json.loads(lines[2][len("data: "):]) == counters.snapshot()
+    assert next(events) == ": heartbeat\n\n"
+
+
+@pytest.fixture
+def replica_set():
+    uri = os.getenv("LIVE_TEST_MONGO_URI")
+    if not uri:
+        pytest.skip("LIVE_TEST_MONGO_URI is not set")
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        if not client.admin.command("hello").get("setName"):
+            pytest.skip(f"{uri} is not a replica set")
+    except PyMongoError as e:
+        pytest.skip(f"no mongod at {uri}: {e}")
+    client.drop_database(TEST_DB)
+    yield client
+    client.drop_database(TEST_DB)
+    client.close()
+
+
+def _wait_for(counters, expected, timeout=10):
+    deadline = time.monotonic() + timeout
+    version = None
+    while _counts(counters) != expected and time.monotonic() < deadline:
+        version = counters.wait_for_change(version, 0.5)
+    return _counts(counters)
+
+
+def test_change_stream_keeps_counters_current(replica_set):
+    events = replica_set[TEST_DB]["events"]
+    now = datetime.utcnow()
+    # Counted by the initial reset
+    events.insert_one({"createdAt": now, "status": "error"})
+
+    counters = LiveCounters(replica_set, counters=COUNTERS).start()
+    try:
+        deadline = time.monotonic() + 10
+        while counters.day is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _counts(counters) == {"metrics1": 1, "metrics2": 1}
+
+        stream = sse_events(counters, heartbeat=0.01)
+        assert json.loads(next(stream).split("data: ", 1)[1]) == counters.snapshot()
+
+        ok_id = events.insert_one({"createdAt": now, "status": "ok"}).inserted_id
+        events.insert_one({"createdAt": now, "status": "error", "source_type": "edgar"})
+        events.insert_one({"createdAt": datetime(2000, 1, 1), "status": "error"})
+        assert _wait_for(counters, {"metrics1": 3, "metrics2": 1}) == {"metrics1": 3, "metrics2": 1}
+
+        events.update_one({"_id": ok_id}, {"$set": {"status": "error"}})
+        assert _wait_for(counters, {"metrics1": 3, "metrics2": 2}) == {"metrics1": 3, "metrics2": 2}
+
+        events.delete_one({"_id": ok_id})
+        assert _wait_for(counters, {"metrics1": 2, "metrics2": 1}) == {"metrics1": 2, "metrics2": 1}
+
+        # The stream sends the changed counts as its next event
+        event = next(stream)
+        assert event.startswith(f"id: {counters.version}\nevent: counters\n")
+        assert json.loads(event.split("data: ", 1)[1])["graphs"]["events"] == {"metrics1": 2, "metrics2": 1}
+    finally:
+        counters.stop()
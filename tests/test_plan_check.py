@@ -0,0 +1,76 @@
+"""
+Query-plan checks (bench/plan_check.py) as test cases.
+
+The per-case checks explain real queries, so they need a mongod they may
+drop and reseed: set BENCH_MONGO_URI to enable them, and PLAN_CHECK_SEED_SIZE
+to change the seed size (default 20000).
+"""
+import os
+
+import pytest
+
+from plan_check import DEFAULT_MAX_DOCS_RATIO, check_case, check_query
+from run_services import service_cases
+
+
+def _summary(stages, indexes=(), keys=0, docs=0, returned=1):
+    return {
+        "stages": list(stages), "indexes": set(indexes), "keys_examined": keys,
+        "docs_examined": docs, "returned": returned, "lookups": [],
+    }
+
+
+def _query(label, namespace):
+    return {"label": label, "namespace": namespace}
+
+
+def test_collscan_fails():
+    failures = check_query(_query("count_data_by_day", "turf_mvp.contacts"), _summary(["COLLSCAN"], docs=1, returned=1))
+    assert any("COLLSCAN" in failure for failure in failures)
+
+
+def test_expected_index_missing_fails():
+    failures = check_query(_query("count_data_by_day", "turf_mvp.contacts"), _summary(["IXSCAN"], ["other_1"], 1, 1))
+    assert any("expected one of" in failure for failure in failures)
+
+
+def test_ratio_exceeded_fails():
+    summary = _summary(["FETCH", "IXSCAN"], ["createdAt_1"], keys=1, docs=int(DEFAULT_MAX_DOCS_RATIO * 10) + 1, returned=10)
+    failures = check_query(_query("count_data_by_day", "turf_mvp.contacts"), summary)
+    assert any("docs examined" in failure for failure in failures)
+
+
+def test_small_collection_sample_is_allowed():
+    # $sample of 5% or more of a collection is a COLLSCAN and random sort
+    summary = _summary(["SORT", "COLLSCAN"], docs=6000, returned=1000)
+    assert check_query(_query("count_data_by_day_approx", "turf_mvp.loggers"), summary) == []
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    uri = os.getenv("BENCH_MONGO_URI")
+    if not uri:
+        pytest.skip("BENCH_MONGO_URI is not set")
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from seed import seed, use_client
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"no mongod at {uri}: {e}")
+    seed(client, int(os.getenv("PLAN_CHECK_SEED_SIZE", 20000)), log=lambda line: None)
+    use_client(client)
+    # Build the side collections the read cases expect
+    from services.companies_monitor import refresh_completeness
+    from services.contact_roles import refresh_contact_roles
+    refresh_completeness()
+    refresh_contact_roles()
+    return client
+
+
+@pytest.mark.parametrize("case, fn", service_cases(), ids=[case for case, _ in service_cases()])
+def test_query_plans(seeded, case, fn):
+    failed = check_case(case, fn, log=lambda line: None)
+    assert not failed, "\n".join(f"{label} {namespace}: {'; '.join(failures)}" for label, namespace, failures in failed)
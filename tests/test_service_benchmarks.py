@@ -0,0 +1,52 @@
+"""
+Service benchmarks (the bench/run_services.py cases) under pytest-benchmark.
+
+They need a mongod they may drop and reseed: set BENCH_MONGO_URI to enable
+them, and BENCH_SEED_SIZE to change the seed size (default 10000), e.g.
+
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m pytest tests/test_service_benchmarks.py --benchmark-autosave
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m pytest tests/test_service_benchmarks.py --benchmark-compare
+"""
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from run_services import service_cases  # noqa: E402
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    uri = os.getenv("BENCH_MONGO_URI")
+    if not uri:
+        pytest.skip("BENCH_MONGO_URI is not set")
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from seed import seed, use_client
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        pytest.skip(f"no mongod at {uri}: {e}")
+    seed(client, int(os.getenv("BENCH_SEED_SIZE", 10000)), log=lambda line: None)
+    use_client(client)
+    # Build the side collections the read cases expect
+    from services.companies_monitor import refresh_completeness
+    from services.contact_roles import refresh_contact_roles
+    refresh_completeness()
+    refresh_contact_roles()
+    return client
+
+
+@pytest.mark.parametrize("case, fn", service_cases(), ids=[case for case, _ in service_cases()])
+def test_service(benchmark, seeded, case, fn):
+    from cache import refresh
+
+    benchmark.group = case.split(".")[0]
+    # Bypass cached results so every round runs its queries
+    with refresh():
+        benchmark.pedantic(fn, rounds=ROUNDS, warmup_rounds=1)